@@ -0,0 +1,214 @@
+"""
+This module implements memory-budgeted admission control for dataset ingestion.
+
+Parsing a CSV file holds several copies of its content in memory at once (raw bytes, decoded
+text, DataFrame, records and JSON chunks), so a handful of concurrent large uploads can exhaust
+the memory of a worker. Each upload therefore reserves its estimated memory cost against a
+per-worker budget before it is processed. Uploads that do not fit wait in a bounded FIFO queue,
+and are rejected once the queue is full or their wait times out. Uploads estimated to need more
+than the whole budget are rejected outright, since they would exceed it even on an idle worker.
+"""
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+
+from app.config import app_config
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when an upload cannot be admitted within the memory budget.
+    """
+
+    def __init__(self, retry_after: int):
+        """
+        Initialize the AdmissionRejected instance.
+
+        :param retry_after: The number of seconds after which the client may retry.
+        """
+        super().__init__("Server is busy ingesting other datasets, please retry later.")
+        self.retry_after = retry_after
+
+
+class UploadTooLarge(Exception):
+    """
+    Raised when an upload is estimated to need more memory than the whole budget.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        Initialize the UploadTooLarge instance.
+
+        :param max_size: The size of the largest file that fits within the budget in bytes.
+        """
+        super().__init__(f"File is too large to ingest, the maximum size is {max_size} bytes.")
+        self.max_size = max_size
+
+
+class AdmissionController:
+    """
+    A memory budget shared by the uploads of one worker.
+
+    All methods run on the event loop of the worker, so the bookkeeping needs no locking.
+    """
+
+    def __init__(
+            self,
+            budget_bytes: int,
+            memory_factor: float,
+            max_queue: int,
+            queue_timeout: float,
+            retry_after: int
+    ):
+        """
+        Initialize the AdmissionController instance.
+
+        :param budget_bytes: The memory available to concurrent uploads in bytes.
+        :param memory_factor: The peak memory of an upload as a multiple of its file size.
+        :param max_queue: The maximum number of uploads waiting for memory.
+        :param queue_timeout: The maximum number of seconds an upload waits for memory.
+        :param retry_after: The number of seconds rejected clients are asked to wait before retrying.
+        """
+        self.budget_bytes = budget_bytes
+        self.memory_factor = memory_factor
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.reserved_bytes = 0
+        self.active = 0
+        self.rejected = 0
+        self._waiters = deque()
+
+    def estimate(self, size: int) -> int:
+        """
+        Estimate the memory an upload needs while it is being ingested.
+
+        :param size: The size of the uploaded file in bytes.
+        :return: The estimated memory cost in bytes.
+        """
+        return int(size * self.memory_factor)
+
+    async def acquire(self, nbytes: int) -> None:
+        """
+        Reserve memory for an upload, waiting in the queue if the budget is used up.
+
+        :param nbytes: The number of bytes to reserve.
+        :raises UploadTooLarge: If the reservation exceeds the whole budget.
+        :raises AdmissionRejected: If the queue is full or the wait timed out.
+        """
+        if nbytes > self.budget_bytes:
+            # It would not fit even on an idle worker, so waiting or retrying cannot help
+            self.rejected += 1
+            raise UploadTooLarge(int(self.budget_bytes / self.memory_factor))
+
+        if not self._waiters and self.reserved_bytes + nbytes <= self.budget_bytes:
+            self._admit(nbytes)
+            return
+
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected(self.retry_after)
+
+        waiter = (nbytes, asyncio.get_running_loop().create_future())
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1], self.queue_timeout)
+        except BaseException as error:
+            if waiter[1].done() and not waiter[1].cancelled():
+                # Admitted at the same moment the wait was abandoned
+                self.release(nbytes)
+            if isinstance(error, asyncio.TimeoutError):
+                self.rejected += 1
+                raise AdmissionRejected(self.retry_after) from None
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                # The abandoned waiter may have been holding back smaller ones behind it
+                self._wake()
+
+    def release(self, nbytes: int) -> None:
+        """
+        Return reserved memory to the budget and admit waiting uploads that now fit.
+
+        :param nbytes: The number of bytes to release.
+        """
+        self.reserved_bytes -= nbytes
+        self.active -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int):
+        """
+        Hold a memory reservation for the duration of the block.
+
+        :param nbytes: The number of bytes to reserve.
+        :raises UploadTooLarge: If the reservation exceeds the whole budget.
+        :raises AdmissionRejected: If the reservation could not be made.
+        """
+        await self.acquire(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    def stats(self) -> dict:
+        """
+        Report the current state of the budget and the queue.
+
+        :return: A dictionary of admission statistics.
+        """
+        return {
+            "budget_bytes": self.budget_bytes,
+            "reserved_bytes": self.reserved_bytes,
+            "available_bytes": self.budget_bytes - self.reserved_bytes,
+            "active": self.active,
+            "queue_depth": len(self._waiters),
+            "max_queue": self.max_queue,
+            "rejected": self.rejected
+        }
+
+    def _admit(self, nbytes: int) -> None:
+        """
+        Record a reservation.
+
+        :param nbytes: The number of bytes reserved.
+        """
+        self.reserved_bytes += nbytes
+        self.active += 1
+
+    def _wake(self) -> None:
+        """
+        Admit waiting uploads in FIFO order for as long as they fit within the budget.
+        """
+        while self._waiters:
+            nbytes, future = self._waiters[0]
+            if future.done():
+                # Timed out or cancelled, it no longer needs memory
+                self._waiters.popleft()
+                continue
+            if self.reserved_bytes + nbytes > self.budget_bytes:
+                break
+            self._waiters.popleft()
+            self._admit(nbytes)
+            future.set_result(None)
+
+
+# Instantiate the admission controller of this worker
+admission_controller = AdmissionController(
+    app_config.INGEST_MEMORY_BUDGET_BYTES,
+    app_config.INGEST_MEMORY_FACTOR,
+    app_config.INGEST_MAX_QUEUE,
+    app_config.INGEST_QUEUE_TIMEOUT_SECONDS,
+    app_config.INGEST_RETRY_AFTER_SECONDS
+)
+
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Retrieve the ingestion admission controller.
+
+    :return: The admission controller of this worker.
+    """
+    return admission_controller
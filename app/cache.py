@@ -0,0 +1,217 @@
+"""
+This module implements the local on-disk cache tier for dataset read responses and exports.
+
+Entries are plain files in a directory shared by all uvicorn workers of a container. Readers
+memory-map them, so the operating system page cache holds a single copy for every worker and
+entries larger than RAM are paged in on demand. Writers publish entries atomically by writing
+to a temporary file and renaming it into place, and the total size of the directory is kept
+under a budget by evicting the least recently used entries.
+"""
+
+import glob
+import mmap
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Iterator, Optional
+
+from app.config import app_config
+
+# Temporary files older than this are left over from crashed writers and can be removed
+STALE_TEMPORARY_SECONDS = 3600
+
+
+class DatasetCache:
+    """
+    A size-bounded cache of dataset artifacts stored as memory-mapped files.
+
+    Each entry is identified by a dataset ID and an artifact name, e.g. "json".
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        """
+        Initialize the DatasetCache instance.
+
+        :param directory: The directory where cache entries are stored.
+        :param max_bytes: The maximum total size of all cache entries in bytes.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, dataset_id: str, name: str) -> str:
+        """
+        Build the file path of a cache entry.
+
+        :param dataset_id: The ID of the dataset.
+        :param name: The name of the cached artifact.
+        :return: The path of the cache entry.
+        """
+        return os.path.join(self.directory, f"{dataset_id}.{name}")
+
+    def open(self, dataset_id: str, name: str) -> Optional[mmap.mmap]:
+        """
+        Memory-map a cache entry and mark it as recently used.
+
+        :param dataset_id: The ID of the dataset.
+        :param name: The name of the cached artifact.
+        :return: A read-only memory map of the entry, or None if it is not cached.
+        """
+        path = self._path(dataset_id, name)
+        try:
+            with open(path, "rb") as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    return None
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            # The modification time doubles as the last access time for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            # Missing, or evicted by another worker in the meantime
+            return None
+        return buffer
+
+    @contextmanager
+    def writer(self, dataset_id: str, name: str):
+        """
+        Open a temporary file that is atomically published as a cache entry on success.
+
+        Concurrent readers either see the previous entry or the complete new one, never a
+        partially written file. If the block raises, the temporary file is discarded.
+
+        :param dataset_id: The ID of the dataset.
+        :param name: The name of the cached artifact.
+        :return: A binary file object to write the entry to.
+        """
+        file = tempfile.NamedTemporaryFile(dir=self.directory, prefix=".", suffix=".tmp", delete=False)
+        path = self._path(dataset_id, name)
+        try:
+            with file:
+                yield file
+            os.replace(file.name, path)
+        except BaseException:
+            os.unlink(file.name)
+            raise
+        # Keep the new entry even if it alone exceeds the budget, so the caller can still serve it
+        self.evict(keep=path)
+
+    def store(self, dataset_id: str, name: str, write: Callable[[BinaryIO], None]) -> Optional[mmap.mmap]:
+        """
+        Write a cache entry, publish it atomically and memory-map it for the caller.
+
+        The map is taken before the entry is published, so it stays readable even if another
+        worker evicts the entry right away.
+
+        :param dataset_id: The ID of the dataset.
+        :param name: The name of the cached artifact.
+        :param write: A function writing the content of the entry to a binary file object.
+        :return: A read-only memory map of the entry, or None if it is empty.
+        """
+        buffer = None
+        try:
+            with self.writer(dataset_id, name) as file:
+                write(file)
+                file.flush()
+                if file.tell() > 0:
+                    buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            if buffer is not None:
+                buffer.close()
+            raise
+        return buffer
+
+    def put(self, dataset_id: str, name: str, data: bytes) -> None:
+        """
+        Store a cache entry.
+
+        :param dataset_id: The ID of the dataset.
+        :param name: The name of the cached artifact.
+        :param data: The content of the entry.
+        """
+        with self.writer(dataset_id, name) as file:
+            file.write(data)
+
+    def invalidate(self, dataset_id: str) -> None:
+        """
+        Remove every cached artifact of a dataset.
+
+        :param dataset_id: The ID of the dataset.
+        """
+        for path in glob.glob(self._path(glob.escape(dataset_id), "*")):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        Remove the least recently used entries until the cache fits within its budget.
+
+        :param keep: The path of an entry that must not be removed.
+        """
+        entries = []
+        total = 0
+        now = time.time()
+        with os.scandir(self.directory) as iterator:
+            for entry in iterator:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.startswith("."):
+                    # Temporary file of an in-flight writer, or of one that crashed long ago
+                    if now - stat.st_mtime > STALE_TEMPORARY_SECONDS:
+                        self._unlink(entry.path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            self._unlink(path)
+            total -= size
+
+    @staticmethod
+    def _unlink(path: str) -> None:
+        """
+        Remove a file, ignoring files already removed by another worker.
+
+        Workers that still have the file memory-mapped keep reading it until they unmap it.
+
+        :param path: The path of the file to remove.
+        """
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def iter_buffer(buffer: mmap.mmap, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """
+    Stream a memory-mapped cache entry in chunks and unmap it once exhausted.
+
+    :param buffer: The memory map to stream.
+    :param chunk_size: The number of bytes per chunk.
+    :return: An iterator over the chunks of the entry.
+    """
+    try:
+        for offset in range(0, len(buffer), chunk_size):
+            yield buffer[offset:offset + chunk_size]
+    finally:
+        buffer.close()
+
+
+# Instantiate the cache shared by the routes of this worker
+dataset_cache = DatasetCache(app_config.CACHE_DIR, app_config.CACHE_MAX_BYTES)
+
+
+def get_dataset_cache() -> DatasetCache:
+    """
+    Retrieve the local dataset cache.
+
+    :return: The dataset cache of this worker.
+    """
+    return dataset_cache
@@ -3,6 +3,7 @@ This module defines the application settings using Pydantic for environment vari
 """
 
 import os
+import tempfile
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings
 
@@ -20,12 +21,36 @@ class AppConfig(BaseSettings):
         SECRET_KEY (str): The secret key used for JWT encoding and decoding.
         ALGORITHM (str): The algorithm used for JWT token creation.
         ACCESS_TOKEN_EXPIRE_SECONDS (int): The expiration time for access tokens in seconds.
+        CACHE_DIR (str): The directory of the local dataset cache shared by all workers.
+        CACHE_MAX_BYTES (int): The maximum total size of the local dataset cache in bytes.
+        CHUNK_ROWS (int): The maximum number of rows stored per dataset chunk.
+        CHUNK_BYTES (int): The size in bytes after which a dataset chunk is closed, well below MongoDB's 16 MB limit.
+        GC_BATCH_SIZE (int): The maximum number of chunks removed per delete when reclaiming a dataset.
+        GC_MAX_DATASETS (int): The maximum number of datasets reclaimed per garbage collection round.
+        GC_INTERVAL_SECONDS (float): The time between two periodic garbage collection sweeps of a worker in seconds.
+        INGEST_MEMORY_BUDGET_BYTES (int): The memory available to concurrent uploads of one worker in bytes.
+        INGEST_MEMORY_FACTOR (float): The estimated peak memory of an upload as a multiple of its file size.
+        INGEST_MAX_QUEUE (int): The maximum number of uploads waiting for memory per worker.
+        INGEST_QUEUE_TIMEOUT_SECONDS (float): The maximum time an upload waits for memory in seconds.
+        INGEST_RETRY_AFTER_SECONDS (int): The Retry-After value sent with rejected uploads in seconds.
     """
     DATABASE_URL: str = os.getenv("DATABASE_URL")
     DATABASE_NAME: str = os.getenv("DATABASE_NAME")
     SECRET_KEY: str = os.getenv("SECRET_KEY")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_SECONDS: int = 1800
+    CACHE_DIR: str = os.path.join(tempfile.gettempdir(), "dataset-api-cache")
+    CACHE_MAX_BYTES: int = 1024 ** 3
+    CHUNK_ROWS: int = 10000
+    CHUNK_BYTES: int = 8 * 1024 ** 2
+    GC_BATCH_SIZE: int = 100
+    GC_MAX_DATASETS: int = 10
+    GC_INTERVAL_SECONDS: float = 300.0
+    INGEST_MEMORY_BUDGET_BYTES: int = 768 * 1024 ** 2
+    INGEST_MEMORY_FACTOR: float = 20.0
+    INGEST_MAX_QUEUE: int = 8
+    INGEST_QUEUE_TIMEOUT_SECONDS: float = 30.0
+    INGEST_RETRY_AFTER_SECONDS: int = 10
 
 
 # Instantiate the settings object to be used throughout the application
@@ -1,31 +1,309 @@
 """
 This module provides functions to interact with the dataset collection in the MongoDB database.
+
+The records of a dataset are stored as JSON encoded chunks in a separate chunk collection, so
+appending rows only writes new chunks instead of rewriting the whole dataset. Values of the key
+columns chosen at upload are indexed in a key collection, which maps each value to its chunk
+and row offset for point lookups.
+
+Deleting a dataset only marks it as deleted, which hides it from reads immediately. Its chunks
+are reclaimed afterwards in bounded batches by collect_deleted_datasets. Datasets with an
+expiration date are hidden once it passes and removed by the MongoDB TTL monitor.
 """
 
+import json
 from bson.objectid import ObjectId
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from app.ingestion import join_chunks
+
+# Number of key index entries written per insert
+KEY_INSERT_BATCH_SIZE = 10000
+
+# Uncommitted chunks older than this are left over from crashed appends and can be removed
+STALE_BATCH_SECONDS = 3600
+
+# Error code of MongoDB for a unique index violation
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _visible_filter() -> dict:
+    """
+    Build the query filter matching datasets that are neither deleted nor expired.
+
+    :return: The query filter.
+    """
+    return {
+        "deleted_at": {"$exists": False},
+        "$or": [
+            {"expires_at": {"$exists": False}},
+            {"expires_at": {"$gt": datetime.now(timezone.utc)}}
+        ]
+    }
+
+
+def create_dataset_indexes(collection, chunk_collection, key_collection) -> None:
+    """
+    Create the indexes used to read, append, look up and expire datasets.
+
+    :param collection: The mongo db collection.
+    :param chunk_collection: The mongo db collection of dataset chunks.
+    :param key_collection: The mongo db collection of dataset key index entries.
+    """
+    # The unique index also rejects concurrent appends that claim the same chunk positions
+    chunk_collection.create_index([("dataset_id", ASCENDING), ("index", ASCENDING)], unique=True)
+    key_collection.create_index([("dataset_id", ASCENDING), ("column", ASCENDING), ("value", ASCENDING)])
+
+    # Let the TTL monitor remove expired datasets, their chunks and keys without a client issuing deletes
+    collection.create_index("expires_at", expireAfterSeconds=0)
+    chunk_collection.create_index("expires_at", expireAfterSeconds=0)
+    key_collection.create_index("expires_at", expireAfterSeconds=0)
+
+    # Sparse, since only deleted datasets have the field
+    collection.create_index("deleted_at", sparse=True)
+
+
+def _insert_chunks(
+        chunk_collection,
+        dataset_id: ObjectId,
+        batch_id: ObjectId,
+        first_index: int,
+        chunks: list,
+        expires_at: Optional[datetime]
+) -> None:
+    """
+    Insert storage chunks of a dataset.
+
+    :param chunk_collection: The mongo db collection of dataset chunks.
+    :param dataset_id: The ObjectId of the dataset.
+    :param batch_id: The ObjectId identifying the upload or append that wrote the chunks.
+    :param first_index: The position of the first chunk within the dataset.
+    :param chunks: A list of tuples of the number of rows and the JSON array of each chunk.
+    :param expires_at: The expiration date of the dataset, or None if it does not expire.
+    """
+    documents = [{
+        "dataset_id": dataset_id,
+        "index": first_index + offset,
+        "batch_id": batch_id,
+        "rows": rows,
+        "content": content
+    } for offset, (rows, content) in enumerate(chunks)]
+    if expires_at is not None:
+        # Chunks carry the expiration date too, so the TTL monitor removes them with the dataset
+        for document in documents:
+            document["expires_at"] = expires_at
+    if documents:
+        chunk_collection.insert_many(documents)
+
+
+def _insert_keys(
+        key_collection,
+        dataset_id: ObjectId,
+        batch_id: ObjectId,
+        entries: list,
+        expires_at: Optional[datetime]
+) -> None:
+    """
+    Insert key index entries of a dataset in batches.
+
+    :param key_collection: The mongo db collection of dataset key index entries.
+    :param dataset_id: The ObjectId of the dataset.
+    :param batch_id: The ObjectId identifying the upload or append that wrote the entries.
+    :param entries: A list of tuples of the column, the value, the chunk and the row offset within the chunk.
+    :param expires_at: The expiration date of the dataset, or None if it does not expire.
+    """
+    for start in range(0, len(entries), KEY_INSERT_BATCH_SIZE):
+        documents = [{
+            "dataset_id": dataset_id,
+            "column": column,
+            "value": value,
+            "chunk": chunk,
+            "offset": offset,
+            "batch_id": batch_id
+        } for column, value, chunk, offset in entries[start:start + KEY_INSERT_BATCH_SIZE]]
+        if expires_at is not None:
+            for document in documents:
+                document["expires_at"] = expires_at
+        key_collection.insert_many(documents)
+
+
+def _is_duplicate_key_error(error: Exception) -> bool:
+    """
+    Check whether a write failed because of a unique index violation.
+
+    insert_one reports it as DuplicateKeyError, insert_many as a BulkWriteError listing the failed writes.
+
+    :param error: The error raised by the write.
+    :return: True if the write violated a unique index.
+    """
+    if isinstance(error, DuplicateKeyError):
+        return True
+    if isinstance(error, BulkWriteError):
+        write_errors = error.details.get("writeErrors", [])
+        return bool(write_errors) and all(
+            write_error.get("code") == DUPLICATE_KEY_ERROR for write_error in write_errors
+        )
+    return False
+
+
+def _discard_batch(chunk_collection, key_collection, dataset_id: ObjectId, batch_id: ObjectId) -> None:
+    """
+    Remove the chunks and keys written by one upload or append.
+
+    :param chunk_collection: The mongo db collection of dataset chunks.
+    :param key_collection: The mongo db collection of dataset key index entries.
+    :param dataset_id: The ObjectId of the dataset.
+    :param batch_id: The ObjectId identifying the upload or append that wrote them.
+    """
+    chunk_collection.delete_many({"dataset_id": dataset_id, "batch_id": batch_id})
+    key_collection.delete_many({"dataset_id": dataset_id, "batch_id": batch_id})
+
+
+def _discard_stale_uncommitted(chunk_collection, key_collection, dataset: dict) -> None:
+    """
+    Remove chunks and keys of appends that crashed before committing them to the dataset document.
+
+    They would otherwise hold the next chunk positions and make every later append conflict.
+    Recent batches are kept, since they may belong to an append that is still in progress.
+
+    :param chunk_collection: The mongo db collection of dataset chunks.
+    :param key_collection: The mongo db collection of dataset key index entries.
+    :param dataset: The dataset document as returned by get_dataset_by_id.
+    """
+    # Batch IDs are ObjectIds, so they encode when the upload or append that wrote them started
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=STALE_BATCH_SECONDS)
+    stale_batch = {"$lt": ObjectId.from_datetime(stale_before)}
+    chunk_collection.delete_many(
+        {"dataset_id": dataset["_id"], "index": {"$gte": dataset["chunk_count"]}, "batch_id": stale_batch}
+    )
+    key_collection.delete_many(
+        {"dataset_id": dataset["_id"], "chunk": {"$gte": dataset["chunk_count"]}, "batch_id": stale_batch}
+    )
 
 
-def insert_dataset(collection, filename: str, size: int, content: str) -> None:
+def insert_dataset(
+        collection,
+        chunk_collection,
+        key_collection,
+        filename: str,
+        size: int,
+        columns: list,
+        dtypes: dict,
+        chunks: list,
+        key_columns: list,
+        key_entries: list,
+        expires_at: Optional[datetime] = None
+) -> str:
     """
-    Insert a new dataset document into the collection.
+    Insert a new dataset document, its storage chunks and its key index.
+
+    The chunks and keys are written first, so the dataset only becomes visible once all of its rows are stored.
+    If any write fails, the chunks and keys written so far are removed again.
 
     :param collection: The mongo db collection.
+    :param chunk_collection: The mongo db collection of dataset chunks.
+    :param key_collection: The mongo db collection of dataset key index entries.
     :param filename: The name of the dataset file.
     :param size: The size of the dataset file.
-    :param content: The content of the dataset file.
+    :param columns: The column names of the dataset.
+    :param dtypes: The column types of the dataset.
+    :param chunks: A list of tuples of the number of rows and the JSON array of each chunk.
+    :param key_columns: The columns indexed for point lookups.
+    :param key_entries: The key index entries as returned by build_key_entries.
+    :param expires_at: The date after which the dataset expires, or None to keep it until deleted.
+    :return: The ObjectId of the new dataset as a string.
     """
-    collection.insert_one({
+    dataset_id = ObjectId()
+    batch_id = ObjectId()
+    dataset = {
+        "_id": dataset_id,
         "filename": filename,
         "size": size,
-        "content": content,
+        "columns": columns,
+        "dtypes": dtypes,
+        "key_columns": key_columns,
+        "row_count": sum(rows for rows, _ in chunks),
+        "chunk_count": len(chunks),
+        "version": 1,
         "upload_date": datetime.now()  # Store the current date and time as the upload date
-    })
+    }
+    if expires_at is not None:
+        dataset["expires_at"] = expires_at
+    try:
+        _insert_chunks(chunk_collection, dataset_id, batch_id, 0, chunks, expires_at)
+        _insert_keys(key_collection, dataset_id, batch_id, key_entries, expires_at)
+        collection.insert_one(dataset)
+    except BaseException:
+        # Without a dataset document the garbage collector would never find them
+        _discard_batch(chunk_collection, key_collection, dataset_id, batch_id)
+        raise
+    return str(dataset_id)
+
+
+def append_dataset_chunks(
+        collection,
+        chunk_collection,
+        key_collection,
+        dataset: dict,
+        size: int,
+        dtypes: dict,
+        chunks: list,
+        key_entries: list
+) -> bool:
+    """
+    Append storage chunks to an existing dataset and update its statistics incrementally.
+
+    The new chunks and keys stay invisible to readers until the dataset document is updated. If
+    another append to the same dataset wins the race, the dataset is deleted meanwhile, or any
+    write fails, the chunks and keys written here are removed again.
+
+    :param collection: The mongo db collection.
+    :param chunk_collection: The mongo db collection of dataset chunks.
+    :param key_collection: The mongo db collection of dataset key index entries.
+    :param dataset: The dataset document as returned by get_dataset_by_id.
+    :param size: The size of the appended file.
+    :param dtypes: The column types of the dataset including the appended rows, or None if not tracked.
+    :param chunks: A list of tuples of the number of rows and the JSON array of each chunk.
+    :param key_entries: The key index entries of the appended rows as returned by build_key_entries.
+    :return: True if the chunks were appended, False if a concurrent append conflicted.
+    """
+    first_index = dataset["chunk_count"]
+    batch_id = ObjectId()
+    _discard_stale_uncommitted(chunk_collection, key_collection, dataset)
+    try:
+        _insert_chunks(chunk_collection, dataset["_id"], batch_id, first_index, chunks, dataset.get("expires_at"))
+        _insert_keys(key_collection, dataset["_id"], batch_id, key_entries, dataset.get("expires_at"))
+        update = {"$inc": {
+            "size": size,
+            "row_count": sum(rows for rows, _ in chunks),
+            "chunk_count": len(chunks),
+            "version": 1
+        }}
+        if dtypes is not None:
+            update["$set"] = {"dtypes": dtypes}
+        result = collection.update_one(
+            # Only if nothing was appended meanwhile and the dataset was not deleted
+            {"_id": dataset["_id"], "version": dataset["version"], "deleted_at": {"$exists": False}},
+            update
+        )
+        if result.matched_count == 1:
+            return True
+    except BaseException as error:
+        _discard_batch(chunk_collection, key_collection, dataset["_id"], batch_id)
+        if _is_duplicate_key_error(error):
+            # Another append claimed the same chunk positions first
+            return False
+        raise
+    _discard_batch(chunk_collection, key_collection, dataset["_id"], batch_id)
+    return False
 
 
 def get_all_datasets(collection) -> list:
     """
-    Retrieve all datasets from the collection without the content field.
+    Retrieve all visible datasets from the collection without the content field.
 
     :param collection: The mongo db collection.
     :return: A list of dictionaries containing dataset metadata.
@@ -34,26 +312,169 @@ def get_all_datasets(collection) -> list:
         "id": str(dataset.get("_id")),  # Convert ObjectId to string for JSON serialization
         "filename": dataset.get("filename"),
         "size": dataset.get("size"),
-        "upload_date": dataset.get("upload_date")
-    } for dataset in collection.find({}, {"content": 0})]  # Exclude the content field
+        "row_count": dataset.get("row_count"),
+        "upload_date": dataset.get("upload_date"),
+        "expires_at": dataset.get("expires_at")
+    } for dataset in collection.find(_visible_filter(), {"content": 0})]  # Exclude the content field
 
 
 def get_dataset_by_id(collection, dataset_id: str) -> dict:
     """
-    Retrieve a dataset by its ObjectId.
+    Retrieve the metadata of a visible dataset by its ObjectId.
 
     :param collection: The mongo db collection.
     :param dataset_id: The ObjectId of the dataset as a string.
-    :return: A dictionary containing the dataset content or None if not found.
+    :return: A dictionary containing the dataset metadata or None if not found, deleted or expired.
+    """
+    return collection.find_one(
+        {"_id": ObjectId(dataset_id), **_visible_filter()},
+        {"content": 0}  # Exclude the content field
+    )
+
+
+def iter_dataset_chunks(collection, chunk_collection, dataset: dict) -> Iterator[str]:
+    """
+    Iterate over the storage chunks of a dataset in order.
+
+    :param collection: The mongo db collection.
+    :param chunk_collection: The mongo db collection of dataset chunks.
+    :param dataset: The dataset document as returned by get_dataset_by_id.
+    :return: An iterator over the JSON arrays of the chunks.
+    """
+    if "chunk_count" not in dataset:
+        # Datasets uploaded before chunked storage keep all records in a single content field
+        yield collection.find_one({"_id": dataset["_id"]}, {"content": 1}).get("content", "[]")
+        return
+
+    # Ignore chunks of appends that have not been committed to the dataset document yet
+    chunks = chunk_collection.find(
+        {"dataset_id": dataset["_id"], "index": {"$lt": dataset["chunk_count"]}},
+        {"content": 1}
+    ).sort("index", ASCENDING)
+    for chunk in chunks:
+        yield chunk["content"]
+
+
+def iter_dataset_content(collection, chunk_collection, dataset: dict) -> Iterator[str]:
+    """
+    Assemble the content of a dataset from its storage chunks, one chunk at a time.
+
+    :param collection: The mongo db collection.
+    :param chunk_collection: The mongo db collection of dataset chunks.
+    :param dataset: The dataset document as returned by get_dataset_by_id.
+    :return: An iterator over the pieces of the records of the dataset as a JSON array.
+    """
+    return join_chunks(iter_dataset_chunks(collection, chunk_collection, dataset))
+
+
+def find_rows_by_key(chunk_collection, key_collection, dataset: dict, column: str, values: list) -> list:
+    """
+    Retrieve the rows of a dataset whose key column matches any of the given values.
+
+    The key index gives the chunk and row offset of every match, so only the chunks holding
+    matching rows are fetched, each of them once.
+
+    :param chunk_collection: The mongo db collection of dataset chunks.
+    :param key_collection: The mongo db collection of dataset key index entries.
+    :param dataset: The dataset document as returned by get_dataset_by_id.
+    :param column: The key column to match.
+    :param values: The key values to look up, normalised by key_value or lookup_value.
+    :return: A list of the matching records, in storage order.
     """
-    return collection.find_one({"_id": ObjectId(dataset_id)}, {"content": 1})  # Only include the content field
+    # Ignore keys of appends that have not been committed to the dataset document yet
+    matches = key_collection.find(
+        {
+            "dataset_id": dataset["_id"],
+            "column": column,
+            "value": {"$in": values},
+            "chunk": {"$lt": dataset["chunk_count"]}
+        },
+        {"chunk": 1, "offset": 1}
+    )
+    offsets = {}
+    for match in matches:
+        offsets.setdefault(match["chunk"], []).append(match["offset"])
+    if not offsets:
+        return []
+
+    chunks = chunk_collection.find(
+        {"dataset_id": dataset["_id"], "index": {"$in": list(offsets)}},
+        {"index": 1, "content": 1}
+    ).sort("index", ASCENDING)
+
+    rows = []
+    for chunk in chunks:
+        # Missing values are stored as NaN, which is not valid in a JSON response
+        records = json.loads(chunk["content"], parse_constant=lambda constant: None)
+        rows.extend(records[offset] for offset in sorted(offsets[chunk["index"]]))
+    return rows
 
 
-def delete_dataset_by_id(collection, dataset_id: str) -> None:
+def delete_dataset_by_id(collection, dataset_id: str) -> bool:
     """
-    Delete a dataset by its ObjectId.
+    Mark a dataset as deleted by its ObjectId, hiding it from reads immediately.
+
+    The storage of the dataset is reclaimed later by collect_deleted_datasets.
 
     :param collection: The mongo db collection.
     :param dataset_id: The ObjectId of the dataset as a string.
+    :return: True if a visible dataset was marked as deleted, False if none matched.
+    """
+    result = collection.update_one(
+        {"_id": ObjectId(dataset_id), **_visible_filter()},
+        {"$set": {"deleted_at": datetime.now(timezone.utc)}}
+    )
+    return result.matched_count == 1
+
+
+def purge_dataset(collection, chunk_collection, key_collection, dataset_id: ObjectId, batch_size: int) -> None:
     """
-    collection.delete_one({"_id": ObjectId(dataset_id)})  # Perform the deletion
+    Remove a dataset document, all of its storage chunks and its key index.
+
+    Chunks and keys are deleted in batches so that a large dataset never turns into a single
+    long-running delete.
+
+    :param collection: The mongo db collection.
+    :param chunk_collection: The mongo db collection of dataset chunks.
+    :param key_collection: The mongo db collection of dataset key index entries.
+    :param dataset_id: The ObjectId of the dataset.
+    :param batch_size: The maximum number of chunks or keys removed per delete.
+    """
+    for storage_collection in (chunk_collection, key_collection):
+        while True:
+            documents = storage_collection.find({"dataset_id": dataset_id}, {"_id": 1}).limit(batch_size)
+            document_ids = [document["_id"] for document in documents]
+            if not document_ids:
+                break
+            storage_collection.delete_many({"_id": {"$in": document_ids}})
+
+    # Remove the dataset document last, so an interrupted purge is picked up again by the next collection
+    collection.delete_one({"_id": dataset_id})
+
+
+def collect_deleted_datasets(collection, chunk_collection, key_collection, batch_size: int, limit: int) -> list:
+    """
+    Reclaim the storage of deleted and expired datasets.
+
+    Expired datasets are removed here as well, so their storage does not wait for the TTL monitor.
+
+    :param collection: The mongo db collection.
+    :param chunk_collection: The mongo db collection of dataset chunks.
+    :param key_collection: The mongo db collection of dataset key index entries.
+    :param batch_size: The maximum number of chunks or keys removed per delete.
+    :param limit: The maximum number of datasets reclaimed by this call.
+    :return: The ObjectIds of the reclaimed datasets as strings.
+    """
+    garbage = collection.find(
+        {"$or": [
+            {"deleted_at": {"$exists": True}},
+            {"expires_at": {"$lte": datetime.now(timezone.utc)}}
+        ]},
+        {"_id": 1}
+    ).limit(limit)
+
+    collected = []
+    for dataset in list(garbage):
+        purge_dataset(collection, chunk_collection, key_collection, dataset["_id"], batch_size)
+        collected.append(str(dataset["_id"]))
+    return collected
@@ -0,0 +1,110 @@
+"""
+This module encodes datasets as Parquet files or Arrow IPC streams for training pipelines.
+
+The stored chunks are converted one at a time into Arrow record batches, so exporting a dataset
+never holds more than one chunk in memory. pyarrow is imported on first use, like pandas in
+app.ingestion, so it does not add to worker startup.
+"""
+
+import itertools
+import json
+import math
+from typing import Iterable, Optional
+
+# Media types of the supported export formats, keyed by the format name used in requests
+EXPORT_MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream"
+}
+
+
+def _clean_value(value, dtype: str):
+    """
+    Convert a stored value to the Python value Arrow expects for the column type.
+
+    :param value: The value decoded from the stored JSON chunk.
+    :param dtype: The column type of the dataset.
+    :return: The converted value, None for missing values.
+    """
+    # pandas represents missing values as NaN, Arrow as null
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if dtype == "string" and not isinstance(value, str):
+        return str(value)
+    return value
+
+
+def _infer_dtypes(columns: list, records: list) -> dict:
+    """
+    Infer the column types of a dataset stored without them from its first chunk.
+
+    :param columns: The column names of the dataset.
+    :param records: The records of the first chunk.
+    :return: A dictionary of column types ("int64", "float64", "bool" or "string").
+    """
+    import pyarrow as pa
+
+    dtypes = {}
+    for column in columns:
+        try:
+            arrow_type = pa.array([_clean_value(record.get(column), None) for record in records]).type
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrow_type = pa.string()
+        if pa.types.is_integer(arrow_type):
+            dtypes[column] = "int64"
+        elif pa.types.is_floating(arrow_type):
+            dtypes[column] = "float64"
+        elif pa.types.is_boolean(arrow_type):
+            dtypes[column] = "bool"
+        else:
+            dtypes[column] = "string"
+    return dtypes
+
+
+def write_export(
+        chunks: Iterable[str],
+        columns: Optional[list],
+        dtypes: Optional[dict],
+        export_format: str,
+        sink
+) -> None:
+    """
+    Encode the stored chunks of a dataset into an export format.
+
+    Every stored chunk becomes one record batch, or one row group for Parquet.
+
+    :param chunks: The JSON arrays of the dataset chunks in order.
+    :param columns: The column names of the dataset, or None to take them from the first record.
+    :param dtypes: The column types of the dataset, or None to infer them from the first chunk.
+    :param export_format: The export format, one of EXPORT_MEDIA_TYPES.
+    :param sink: The binary file object to write the export to.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    batches = (json.loads(chunk) for chunk in chunks)
+    first = next(batches, [])
+    if columns is None:
+        columns = [str(column) for column in first[0]] if first else []
+    if dtypes is None:
+        dtypes = _infer_dtypes(columns, first)
+
+    arrow_types = {"int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_()}
+    schema = pa.schema([(column, arrow_types.get(dtypes.get(column), pa.string())) for column in columns])
+
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    with writer:
+        for records in itertools.chain([first], batches):
+            if not records:
+                continue
+            writer.write_batch(pa.RecordBatch.from_arrays([
+                pa.array(
+                    [_clean_value(record.get(field.name), dtypes.get(field.name)) for record in records],
+                    type=field.type
+                )
+                for field in schema
+            ], schema=schema))
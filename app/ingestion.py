@@ -0,0 +1,169 @@
+"""
+This module parses uploaded CSV files into dataset records and encodes them as storage chunks.
+
+pandas and numpy are imported on first use rather than at module level, so workers that only
+serve authentication or read traffic never pay their import time and memory.
+"""
+
+import json
+import math
+from io import StringIO
+from typing import Iterable, Iterator, Optional
+
+# Column types recorded for each dataset, keyed by the numpy dtype kind they are derived from
+DTYPE_KINDS = {"i": "int64", "u": "int64", "f": "float64", "b": "bool"}
+
+
+def parse_csv(contents: bytes) -> tuple:
+    """
+    Parse the raw bytes of a CSV file into its columns, column types and a list of records.
+
+    :param contents: The raw bytes of the uploaded CSV file.
+    :return: A tuple of the column names, a dictionary of column types ("int64", "float64", "bool"
+             or "string") and a list of dictionaries, one per row, keyed by column name.
+    """
+    # Deferred import, see the module docstring
+    import pandas as pd
+
+    df = pd.read_csv(StringIO(contents.decode("utf-8")))
+    dtypes = {str(column): DTYPE_KINDS.get(dtype.kind, "string") for column, dtype in df.dtypes.items()}
+    return [str(column) for column in df.columns], dtypes, df.to_dict(orient="records")
+
+
+def merge_dtypes(current: dict, new: dict) -> dict:
+    """
+    Combine the column types of a dataset with those of appended rows.
+
+    Integers widen to floats, and any other mismatch falls back to strings.
+
+    :param current: The column types of the dataset.
+    :param new: The column types of the appended rows.
+    :return: The column types covering both.
+    """
+    merged = {}
+    for column, dtype in current.items():
+        other = new.get(column, dtype)
+        if dtype == other:
+            merged[column] = dtype
+        elif {dtype, other} == {"int64", "float64"}:
+            merged[column] = "float64"
+        else:
+            merged[column] = "string"
+    return merged
+
+
+def split_into_chunks(records: list, chunk_rows: int, chunk_bytes: int) -> list:
+    """
+    Split records into JSON encoded storage chunks.
+
+    A chunk is closed once it holds chunk_rows records or its JSON array reaches chunk_bytes, so
+    wide rows never push a chunk past the MongoDB document size limit. A single record larger
+    than chunk_bytes is stored in a chunk of its own.
+
+    :param records: The records to split.
+    :param chunk_rows: The maximum number of records per chunk.
+    :param chunk_bytes: The size in bytes after which a chunk is closed.
+    :return: A list of tuples of the number of rows and the JSON array of each chunk.
+    """
+    chunks = []
+    encoded = []
+    size = 2  # The brackets of the array
+    for record in records:
+        # Encoded with the default ASCII escaping, so the string length is its size in bytes
+        item = json.dumps(record)
+        if encoded and (len(encoded) == chunk_rows or size + 2 + len(item) > chunk_bytes):
+            chunks.append((len(encoded), "[" + ", ".join(encoded) + "]"))
+            encoded = []
+            size = 2
+        size += len(item) + (2 if encoded else 0)
+        encoded.append(item)
+    if encoded:
+        chunks.append((len(encoded), "[" + ", ".join(encoded) + "]"))
+    return chunks
+
+
+def join_chunks(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Concatenate JSON encoded chunks into a single JSON array without decoding them.
+
+    The array is produced piece by piece, so only one chunk needs to be in memory at a time.
+
+    :param chunks: The JSON arrays of the chunks in order.
+    :return: An iterator over the pieces of a JSON array containing the records of every chunk.
+    """
+    yield "["
+    first = True
+    for chunk in chunks:
+        # Strip the brackets of every non-empty array and join the elements
+        if chunk.strip() == "[]":
+            continue
+        if not first:
+            yield ", "
+        yield chunk[1:-1]
+        first = False
+    yield "]"
+
+
+def key_value(value):
+    """
+    Normalise a key column value to the string under which it is indexed and looked up.
+
+    :param value: The value of a key column.
+    :return: The normalised string, or None for missing values that are not indexed.
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, float) and value.is_integer():
+        # pandas turns integer columns with missing values into floats, index 7.0 as "7"
+        return str(int(value))
+    return str(value)
+
+
+def lookup_value(value: str, dtype: Optional[str]) -> str:
+    """
+    Normalise a key value given as text, e.g. in a query string, the way key_value indexes it.
+
+    Numbers are parsed for numeric columns, so 7, 7.0 and 7e0 all find the value indexed as "7",
+    and booleans are matched case-insensitively for bool columns.
+
+    :param value: The key value as text.
+    :param dtype: The type of the key column as returned by parse_csv, or None if not tracked.
+    :return: The normalised string, or the value unchanged if it does not parse as the column type.
+    """
+    if dtype in ("int64", "float64"):
+        try:
+            # Parse integers exactly, since floats lose precision beyond 2**53
+            number = int(value)
+        except ValueError:
+            try:
+                number = float(value)
+            except ValueError:
+                return value
+        return key_value(number) or value
+    if dtype == "bool":
+        return {"true": "True", "false": "False"}.get(value.strip().lower(), value)
+    return value
+
+
+def build_key_entries(records: list, key_columns: list, chunks: list, first_chunk: int) -> list:
+    """
+    Map the key column values of records to their position in the storage chunks.
+
+    :param records: The records being stored.
+    :param key_columns: The columns to index.
+    :param chunks: The chunks produced by split_into_chunks for the same records.
+    :param first_chunk: The position of the first chunk of these records within the dataset.
+    :return: A list of tuples of the column, the normalised value, the chunk and the row offset within the chunk.
+    """
+    entries = []
+    if not key_columns:
+        return entries
+    row = 0
+    for chunk, (rows, _) in enumerate(chunks, start=first_chunk):
+        for offset, record in enumerate(records[row:row + rows]):
+            for column in key_columns:
+                value = key_value(record.get(column))
+                if value is not None:
+                    entries.append((column, value, chunk, offset))
+        row += rows
+    return entries
@@ -2,9 +2,31 @@
 This module initializes the FastAPI application and includes the necessary routers for authentication and dataset management.
 """
 
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from app.cache import get_dataset_cache
+from app.config import app_config
+from app.database import get_database
 from app.routes.AuthRouter import auth_router
-from app.routes.DatasetRouter import dataset_router
+from app.routes.DatasetRouter import dataset_router, sweep_garbage
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Run the periodic garbage collection of deleted and expired datasets while the worker is up.
+
+    :param app: The FastAPI application instance.
+    """
+    # Honour dependency overrides, so the sweep uses the same database and cache as the routes
+    sweeper = asyncio.create_task(sweep_garbage(
+        app.dependency_overrides.get(get_database, get_database),
+        app.dependency_overrides.get(get_dataset_cache, get_dataset_cache),
+        app_config.GC_INTERVAL_SECONDS
+    ))
+    yield
+    sweeper.cancel()
 
 
 def create_app() -> FastAPI:
@@ -14,7 +36,7 @@ def create_app() -> FastAPI:
     :return: Configured FastAPI application instance.
     """
     # Initialize FastAPI application
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
 
     # Include the authentication router with a prefix
     app.include_router(auth_router, prefix="/auth")
@@ -1,45 +1,293 @@
 """
-This module defines the routes for dataset operations such as uploading, retrieving, and deleting datasets.
+This module defines the routes for dataset operations such as uploading, appending, retrieving, exporting, and deleting
+datasets.
 """
 
-from fastapi import APIRouter, UploadFile, status, Depends
-from fastapi.responses import JSONResponse
-from io import StringIO
-from typing import List
-
+import asyncio
 import json
-import pandas as pd
+import logging
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, BackgroundTasks, Form, Query, Request, UploadFile, status, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Optional
 
-from app.schemas.DatasetSchema import DatasetListResponse, DatasetDetailResponse
+from app.schemas.DatasetSchema import (
+    DatasetListResponse,
+    DatasetDetailResponse,
+    DatasetRowsResponse,
+    AdmissionStatsResponse
+)
 from app.schemas.GlobalSchema import MessageResponse
 from app.controllers.DatasetController import (
+    create_dataset_indexes,
     insert_dataset,
+    append_dataset_chunks,
     get_dataset_by_id,
+    iter_dataset_content,
+    iter_dataset_chunks,
+    find_rows_by_key,
     get_all_datasets,
-    delete_dataset_by_id
+    delete_dataset_by_id,
+    collect_deleted_datasets
 )
+from app.admission import AdmissionRejected, UploadTooLarge, get_admission_controller
+from app.cache import get_dataset_cache, iter_buffer
+from app.config import app_config
+from app.export import EXPORT_MEDIA_TYPES, write_export
 from app.helper import JWTBearer
+from app.ingestion import parse_csv, merge_dtypes, split_into_chunks, build_key_entries, lookup_value
 from app.database import get_database
 
 dataset_router = APIRouter(dependencies=[Depends(JWTBearer())])
 
+logger = logging.getLogger(__name__)
+
+# Names of the databases whose dataset indexes were already created by this worker
+indexed_databases = set()
+
+
+def ensure_dataset_indexes(database) -> None:
+    """
+    Create the dataset indexes on the first upload or append this worker handles for a database.
+
+    :param database: The mongo db database
+    """
+    if database.name in indexed_databases:
+        return
+    create_dataset_indexes(database["dataset"], database["dataset_chunk"], database["dataset_key"])
+    indexed_databases.add(database.name)
+
+
+def collect_garbage(database, cache) -> None:
+    """
+    Reclaim the storage of deleted and expired datasets and drop their cached artifacts.
+
+    Datasets are collected in rounds of GC_MAX_DATASETS until a round comes back short, so a
+    backlog is cleared in one call.
+
+    :param database: The mongo db database
+    :param cache: The local dataset cache
+    """
+    while True:
+        collected = collect_deleted_datasets(
+            database["dataset"],
+            database["dataset_chunk"],
+            database["dataset_key"],
+            app_config.GC_BATCH_SIZE,
+            app_config.GC_MAX_DATASETS
+        )
+        for dataset_id in collected:
+            cache.invalidate(dataset_id)
+        if len(collected) < app_config.GC_MAX_DATASETS:
+            break
+
+
+async def sweep_garbage(database_factory, cache_factory, interval: float) -> None:
+    """
+    Collect garbage periodically for as long as the worker runs.
+
+    Deletes schedule a collection right away, this sweep picks up what they leave behind, e.g.
+    purges interrupted by a worker restart and datasets that expired without being deleted.
+
+    :param database_factory: The function returning the mongo db database
+    :param cache_factory: The function returning the local dataset cache
+    :param interval: The number of seconds between two sweeps.
+    """
+    while True:
+        try:
+            await run_in_threadpool(collect_garbage, database_factory(), cache_factory())
+        except Exception:
+            # There is no client to report to, retry on the next sweep
+            logger.exception("Garbage collection of deleted datasets failed")
+        await asyncio.sleep(interval)
+
+
+def upload_size(request: Request, file: UploadFile) -> int:
+    """
+    Determine the size of an uploaded file.
+
+    :param request: The incoming request object.
+    :param file: The uploaded file.
+    :return: The size of the file, or of the whole request body if the file size is unknown.
+    """
+    if file.size is not None:
+        return file.size
+    return int(request.headers.get("content-length", 0))
+
+
+def ingest_upload(
+        database,
+        filename: str,
+        size: int,
+        contents: bytes,
+        key_columns: list,
+        expires_at: Optional[datetime]
+):
+    """
+    Parse an uploaded CSV file and store it as a new dataset.
+
+    Runs in the threadpool, since every step is CPU or database bound.
+
+    :param database: The mongo db database
+    :param filename: The name of the uploaded file.
+    :param size: The size of the uploaded file.
+    :param contents: The raw bytes of the uploaded file.
+    :param key_columns: The columns to index for lookups with GET /datasets/{dataset_id}/rows/by-key.
+    :param expires_at: The date after which the dataset expires, or None to keep it until deleted.
+    :return: The response of the upload.
+    """
+    # Convert the CSV file to a list of records
+    columns, dtypes, data = parse_csv(contents)
+
+    # Check if the key columns exist in the CSV file
+    missing_columns = [column for column in key_columns if column not in columns]
+    if missing_columns:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "code": status.HTTP_400_BAD_REQUEST,
+                "message": f"Key columns not found in the CSV file: {', '.join(missing_columns)}"
+            }
+        )
+
+    # Insert the records into MongoDB as storage chunks, along with the key index
+    chunks = split_into_chunks(data, app_config.CHUNK_ROWS, app_config.CHUNK_BYTES)
+    ensure_dataset_indexes(database)
+    insert_dataset(
+        database["dataset"],
+        database["dataset_chunk"],
+        database["dataset_key"],
+        filename,
+        size,
+        columns,
+        dtypes,
+        chunks,
+        key_columns,
+        build_key_entries(data, key_columns, chunks, 0),
+        expires_at
+    )
+
+    return {
+        "code": status.HTTP_200_OK,
+        "message": "Upload successfully"
+    }
+
+
+def ingest_append(database, cache, dataset_id: str, size: int, contents: bytes):
+    """
+    Parse an uploaded CSV file and append its rows to an existing dataset.
+
+    Runs in the threadpool, since every step is CPU or database bound.
+
+    :param database: The mongo db database
+    :param cache: The local dataset cache
+    :param dataset_id: The ID of the dataset to append to.
+    :param size: The size of the uploaded file.
+    :param contents: The raw bytes of the uploaded file.
+    :return: The response of the append.
+    """
+    dataset = get_dataset_by_id(database["dataset"], dataset_id)
+    if dataset is None:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={
+                "code": status.HTTP_404_NOT_FOUND,
+                "message": "Dataset not found"
+            }
+        )
+    if "columns" not in dataset:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "code": status.HTTP_400_BAD_REQUEST,
+                "message": "Dataset was uploaded before appends were supported."
+            }
+        )
+
+    # Convert the CSV file to a list of records and make sure it has the same columns as the dataset
+    columns, dtypes, data = parse_csv(contents)
+    if sorted(columns) != sorted(dataset["columns"]):
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "code": status.HTTP_400_BAD_REQUEST,
+                "message": f"Columns do not match the dataset columns: {', '.join(dataset['columns'])}"
+            }
+        )
+
+    # Store the records in the column order of the dataset
+    data = [{column: record[column] for column in dataset["columns"]} for record in data]
+
+    # Datasets stored without column types keep having them inferred on export
+    if "dtypes" in dataset:
+        dtypes = merge_dtypes(dataset["dtypes"], dtypes)
+    else:
+        dtypes = None
+
+    chunks = split_into_chunks(data, app_config.CHUNK_ROWS, app_config.CHUNK_BYTES)
+    ensure_dataset_indexes(database)
+    appended = append_dataset_chunks(
+        database["dataset"],
+        database["dataset_chunk"],
+        database["dataset_key"],
+        dataset,
+        size,
+        dtypes,
+        chunks,
+        build_key_entries(data, dataset.get("key_columns", []), chunks, dataset["chunk_count"])
+    )
+    if not appended:
+        return JSONResponse(
+            status_code=status.HTTP_409_CONFLICT,
+            content={
+                "code": status.HTTP_409_CONFLICT,
+                "message": "Dataset was modified concurrently, please retry."
+            }
+        )
+
+    # Cached artifacts of the previous version are no longer needed
+    cache.invalidate(str(dataset["_id"]))
+
+    return {
+        "code": status.HTTP_200_OK,
+        "message": "Append successfully"
+    }
+
 
 @dataset_router.post(
     "/upload",
     response_model=MessageResponse,
     responses={
         400: {"model": MessageResponse},
-        500: {"model": MessageResponse}
+        413: {"model": MessageResponse},
+        500: {"model": MessageResponse},
+        503: {"model": MessageResponse}
     },
     status_code=status.HTTP_200_OK,
     tags=["datasets"]
 )
-async def upload_dataset(file: UploadFile, database=Depends(get_database)):
+async def upload_dataset(
+        request: Request,
+        file: UploadFile,
+        ttl_seconds: Optional[int] = Form(None),
+        key_columns: List[str] = Form([]),
+        database=Depends(get_database),
+        admission=Depends(get_admission_controller)
+):
     """
     Upload a new dataset in CSV format.
 
+    Uploads are admitted against the memory budget of the worker, and rejected with 503 when
+    it stays used up, or with 413 when the file alone would exceed it.
+
+    :param request: The incoming request object.
     :param database: The mongo db database
+    :param admission: The ingestion admission controller
     :param file: The CSV file to upload.
+    :param ttl_seconds: The number of seconds after which the dataset expires, or None to keep it until deleted.
+    :param key_columns: The columns to index for lookups with GET /datasets/{dataset_id}/rows/by-key.
     :return: A JSON response indicating success or failure.
     """
     # Check if the uploaded file is a CSV
@@ -52,20 +300,138 @@ async def upload_dataset(file: UploadFile, database=Depends(get_database)):
             }
         )
 
+    # Check if the expiration is in the future
+    if ttl_seconds is not None and ttl_seconds <= 0:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "code": status.HTTP_400_BAD_REQUEST,
+                "message": "Invalid ttl_seconds. It must be a positive number of seconds."
+            }
+        )
+
     try:
-        # Read the CSV file
-        contents = await file.read()
-        df = pd.read_csv(StringIO(contents.decode("utf-8")))
+        # Reserve the memory this upload needs before reading and parsing it
+        async with admission.reserve(admission.estimate(upload_size(request, file))):
+            contents = await file.read()
+            expires_at = None
+            if ttl_seconds is not None:
+                expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
 
-        # Convert DataFrame to dictionary and insert into MongoDB
-        data = df.to_dict(orient="records")
-        insert_dataset(database["dataset"], file.filename, file.size, json.dumps(data))
+            # Parsing, encoding and storing take seconds for large files, keep them off the event loop
+            return await run_in_threadpool(
+                ingest_upload,
+                database,
+                file.filename,
+                file.size,
+                contents,
+                key_columns,
+                expires_at
+            )
 
-        return {
-            "code": status.HTTP_200_OK,
-            "message": "Upload successfully"
-        }
+    except UploadTooLarge as e:
+        # The file would exceed the memory budget of the worker even if it were the only upload
+        return JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={
+                "code": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                "message": str(e)
+            }
+        )
+    except AdmissionRejected as e:
+        # Ask the client to come back once other uploads have released their memory
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(e.retry_after)},
+            content={
+                "code": status.HTTP_503_SERVICE_UNAVAILABLE,
+                "message": str(e)
+            }
+        )
+    except Exception as e:
+        # Handle any exceptions that occur during file processing or data insertion
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={
+                "code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                "message": str(e)
+            }
+        )
+
+
+@dataset_router.post(
+    "/{dataset_id}/append",
+    response_model=MessageResponse,
+    responses={
+        400: {"model": MessageResponse},
+        404: {"model": MessageResponse},
+        409: {"model": MessageResponse},
+        413: {"model": MessageResponse},
+        500: {"model": MessageResponse},
+        503: {"model": MessageResponse}
+    },
+    status_code=status.HTTP_200_OK,
+    tags=["datasets"]
+)
+async def append_dataset(
+        request: Request,
+        dataset_id: str,
+        file: UploadFile,
+        database=Depends(get_database),
+        cache=Depends(get_dataset_cache),
+        admission=Depends(get_admission_controller)
+):
+    """
+    Append the rows of a CSV file to an existing dataset.
+
+    Only the new rows are stored, as additional chunks, and the row count and size of the
+    dataset are updated incrementally. Appends are admitted against the memory budget like uploads.
+
+    :param request: The incoming request object.
+    :param database: The mongo db database
+    :param cache: The local dataset cache
+    :param admission: The ingestion admission controller
+    :param dataset_id: The ID of the dataset to append to.
+    :param file: The CSV file with the rows to append, with the same columns as the dataset.
+    :return: A JSON response indicating success or failure.
+    """
+    # Check if the uploaded file is a CSV
+    if file.content_type != 'text/csv':
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "code": status.HTTP_400_BAD_REQUEST,
+                "message": "Invalid file type. Only CSV files are allowed."
+            }
+        )
 
+    try:
+        # Reserve the memory this upload needs before reading and parsing it
+        async with admission.reserve(admission.estimate(upload_size(request, file))):
+            contents = await file.read()
+
+            # Parsing, encoding and storing take seconds for large files, keep them off the event loop
+            return await run_in_threadpool(ingest_append, database, cache, dataset_id, file.size, contents)
+
+    except UploadTooLarge as e:
+        # The file would exceed the memory budget of the worker even if it were the only upload
+        return JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={
+                "code": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                "message": str(e)
+            }
+        )
+    except AdmissionRejected as e:
+        # Ask the client to come back once other uploads have released their memory
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": str(e.retry_after)},
+            content={
+                "code": status.HTTP_503_SERVICE_UNAVAILABLE,
+                "message": str(e)
+            }
+        )
     except Exception as e:
         # Handle any exceptions that occur during file processing or data insertion
         return JSONResponse(
@@ -107,26 +473,165 @@ async def get_all_datasets_route(database=Depends(get_database)):
         )
 
 
+@dataset_router.get(
+    "/admission",
+    response_model=AdmissionStatsResponse,
+    status_code=status.HTTP_200_OK,
+    tags=["datasets"]
+)
+async def get_admission_stats(admission=Depends(get_admission_controller)):
+    """
+    Report the memory budget, reserved bytes and queue depth of ingestion in this worker.
+
+    Declared before /{dataset_id} so that it is not matched as a dataset ID.
+
+    :param admission: The ingestion admission controller
+    :return: The admission statistics of the worker that served the request.
+    """
+    return admission.stats()
+
+
+def cache_dataset_content(database, cache, dataset: dict, cache_name: str):
+    """
+    Render the response of GET /datasets/{dataset_id} into the local cache, one chunk at a time.
+
+    The response carries the records as a JSON string, so every piece of the JSON array is
+    escaped on its own, which gives the same result as escaping the array as a whole.
+    Runs in the threadpool, since every step is CPU or database bound.
+
+    :param database: The mongo db database
+    :param cache: The local dataset cache
+    :param dataset: The dataset document as returned by get_dataset_by_id.
+    :param cache_name: The name of the cache entry to write.
+    :return: A memory map of the rendered response.
+    """
+    def write(file):
+        file.write(b'{"content":"')
+        for piece in iter_dataset_content(database["dataset"], database["dataset_chunk"], dataset):
+            # Escape like JSONResponse, without the surrounding quotes
+            file.write(json.dumps(piece, ensure_ascii=False)[1:-1].encode("utf-8"))
+        file.write(b'"}')
+
+    return cache.store(str(dataset["_id"]), cache_name, write)
+
+
 @dataset_router.get(
     "/{dataset_id}",
     response_model=DatasetDetailResponse,
     responses={
+        404: {"model": MessageResponse},
         500: {"model": MessageResponse}
     },
     status_code=status.HTTP_200_OK,
     tags=["datasets"]
 )
-async def get_dataset(dataset_id: str, database=Depends(get_database)):
+async def get_dataset(dataset_id: str, database=Depends(get_database), cache=Depends(get_dataset_cache)):
     """
     Retrieve a specific dataset by its ID.
 
+    The response is rendered into the local cache one chunk at a time and served from there, so
+    datasets larger than memory can be read, and repeated reads are served from a memory-mapped
+    file shared by all workers instead of fetching the content from the database.
+
     :param database: The mongo db database
+    :param cache: The local dataset cache
     :param dataset_id: The ID of the dataset to retrieve.
     :return: The dataset content or an error message if not found.
     """
     try:
-        # Fetch the dataset from the database by its ID
-        return get_dataset_by_id(database["dataset"], dataset_id)
+        # Reject malformed IDs before they are used as cache file names
+        dataset_id = str(ObjectId(dataset_id))
+
+        # Fetch the dataset metadata from the database by its ID
+        dataset = get_dataset_by_id(database["dataset"], dataset_id)
+        if dataset is None:
+            return JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content={
+                    "code": status.HTTP_404_NOT_FOUND,
+                    "message": "Dataset not found"
+                }
+            )
+
+        # The version changes on every append, so a cached rendering of an older version is never served
+        cache_name = f"v{dataset.get('version', 1)}.json"
+        buffer = cache.open(dataset_id, cache_name)
+        if buffer is None:
+            # Render the response once into the local cache and serve this and the next reads from it
+            buffer = await run_in_threadpool(cache_dataset_content, database, cache, dataset, cache_name)
+        return StreamingResponse(iter_buffer(buffer), media_type="application/json")
+    except Exception as e:
+        # Handle any exceptions that occur during data retrieval
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={
+                "code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                "message": str(e)
+            }
+        )
+
+
+@dataset_router.get(
+    "/{dataset_id}/rows/by-key",
+    response_model=DatasetRowsResponse,
+    responses={
+        400: {"model": MessageResponse},
+        404: {"model": MessageResponse},
+        500: {"model": MessageResponse}
+    },
+    status_code=status.HTTP_200_OK,
+    tags=["datasets"]
+)
+async def get_dataset_rows_by_key(
+        dataset_id: str,
+        column: str,
+        value: List[str] = Query(...),
+        database=Depends(get_database)
+):
+    """
+    Retrieve the rows of a specific dataset whose key column matches the given values.
+
+    Repeat the value parameter to look up several keys in one request. Values of numeric and bool
+    columns are matched by value, so 7, 7.0 and 7e0 find the same rows, as do true and True.
+
+    :param database: The mongo db database
+    :param dataset_id: The ID of the dataset to search.
+    :param column: The key column to match, one of the key columns given at upload.
+    :param value: The key values to look up.
+    :return: The matching rows or an error message if not found.
+    """
+    try:
+        # Fetch the dataset metadata from the database by its ID
+        dataset = get_dataset_by_id(database["dataset"], dataset_id)
+        if dataset is None:
+            return JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content={
+                    "code": status.HTTP_404_NOT_FOUND,
+                    "message": "Dataset not found"
+                }
+            )
+
+        # Check if the column was indexed at upload
+        if column not in dataset.get("key_columns", []):
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content={
+                    "code": status.HTTP_400_BAD_REQUEST,
+                    "message": f"Column '{column}' is not a key column of the dataset."
+                }
+            )
+
+        # Normalise the values the way they were indexed, e.g. 7.0 to "7" for numeric columns
+        dtype = dataset.get("dtypes", {}).get(column)
+        rows = find_rows_by_key(
+            database["dataset_chunk"],
+            database["dataset_key"],
+            dataset,
+            column,
+            [lookup_value(item, dtype) for item in value]
+        )
+        return {"rows": rows}
     except Exception as e:
         # Handle any exceptions that occur during data retrieval
         return JSONResponse(
@@ -138,26 +643,154 @@ async def get_dataset(dataset_id: str, database=Depends(get_database)):
         )
 
 
+def cache_export(database, cache, dataset: dict, cache_name: str, format: str):
+    """
+    Encode the export of a dataset from its stored chunks into the local cache.
+
+    Runs in the threadpool, since every step is CPU or database bound.
+
+    :param database: The mongo db database
+    :param cache: The local dataset cache
+    :param dataset: The dataset document as returned by get_dataset_by_id.
+    :param cache_name: The name of the cache entry to write.
+    :param format: The export format, either "parquet" or "arrow".
+    :return: A memory map of the encoded export.
+    """
+    def write(file):
+        write_export(
+            iter_dataset_chunks(database["dataset"], database["dataset_chunk"], dataset),
+            dataset.get("columns"),
+            dataset.get("dtypes"),
+            format,
+            file
+        )
+
+    return cache.store(str(dataset["_id"]), cache_name, write)
+
+
+@dataset_router.get(
+    "/{dataset_id}/export",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {media_type: {} for media_type in EXPORT_MEDIA_TYPES.values()}},
+        400: {"model": MessageResponse},
+        404: {"model": MessageResponse},
+        500: {"model": MessageResponse}
+    },
+    status_code=status.HTTP_200_OK,
+    tags=["datasets"]
+)
+async def export_dataset(
+        dataset_id: str,
+        format: str = "parquet",
+        database=Depends(get_database),
+        cache=Depends(get_dataset_cache)
+):
+    """
+    Export a specific dataset as a Parquet file or an Arrow IPC stream.
+
+    The export is encoded straight from the stored chunks, one record batch per chunk, and kept
+    in the local cache so repeated downloads are served without encoding it again.
+
+    :param database: The mongo db database
+    :param cache: The local dataset cache
+    :param dataset_id: The ID of the dataset to export.
+    :param format: The export format, either "parquet" or "arrow".
+    :return: The encoded dataset or an error message if not found.
+    """
+    if format not in EXPORT_MEDIA_TYPES:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={
+                "code": status.HTTP_400_BAD_REQUEST,
+                "message": f"Invalid export format. Supported formats: {', '.join(EXPORT_MEDIA_TYPES)}."
+            }
+        )
+
+    try:
+        # Reject malformed IDs before they are used as cache file names
+        dataset_id = str(ObjectId(dataset_id))
+
+        # Fetch the dataset metadata from the database by its ID
+        dataset = get_dataset_by_id(database["dataset"], dataset_id)
+        if dataset is None:
+            return JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content={
+                    "code": status.HTTP_404_NOT_FOUND,
+                    "message": "Dataset not found"
+                }
+            )
+
+        # Encode the export on first use, the version in the name keeps appends from serving a stale export
+        cache_name = f"v{dataset.get('version', 1)}.{format}"
+        buffer = cache.open(dataset_id, cache_name)
+        if buffer is None:
+            # Fetching every chunk and encoding it is CPU and database bound, keep it off the event loop
+            buffer = await run_in_threadpool(cache_export, database, cache, dataset, cache_name, format)
+
+        filename = f"{dataset.get('filename', dataset_id).rsplit('.', 1)[0]}.{format}"
+        return StreamingResponse(
+            iter_buffer(buffer),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+        )
+    except Exception as e:
+        # Handle any exceptions that occur during data retrieval or encoding
+        return JSONResponse(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            content={
+                "code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                "message": str(e)
+            }
+        )
+
+
 @dataset_router.delete(
     "/{dataset_id}",
     response_model=MessageResponse,
     responses={
+        404: {"model": MessageResponse},
         500: {"model": MessageResponse}
     },
     status_code=status.HTTP_200_OK,
     tags=["datasets"]
 )
-async def delete_dataset(dataset_id: str, database=Depends(get_database)):
+async def delete_dataset(
+        dataset_id: str,
+        background_tasks: BackgroundTasks,
+        database=Depends(get_database),
+        cache=Depends(get_dataset_cache)
+):
     """
     Delete a specific dataset by its ID.
 
+    The dataset is hidden from reads immediately, and its storage is reclaimed in the background
+    after the response has been sent.
+
     :param database: The mongo db database
+    :param cache: The local dataset cache
+    :param background_tasks: The tasks to run after the response has been sent.
     :param dataset_id: The ID of the dataset to delete.
     :return: A JSON response indicating success or failure.
     """
     try:
-        # Delete the dataset from the database by its ID
-        delete_dataset_by_id(database["dataset"], dataset_id)
+        # Mark the dataset as deleted in the database by its ID
+        if not delete_dataset_by_id(database["dataset"], dataset_id):
+            return JSONResponse(
+                status_code=status.HTTP_404_NOT_FOUND,
+                content={
+                    "code": status.HTTP_404_NOT_FOUND,
+                    "message": "Dataset not found"
+                }
+            )
+
+        # Drop the cached artifacts so no worker serves the deleted dataset
+        cache.invalidate(dataset_id)
+
+        # Reclaim the chunks of this and any other deleted or expired dataset
+        background_tasks.add_task(collect_garbage, database, cache)
+
         return {
             "code": status.HTTP_200_OK,
             "message": "Dataset deleted successfully"
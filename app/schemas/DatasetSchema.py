@@ -4,6 +4,7 @@ This module defines the Pydantic schemas used for dataset responses.
 
 from pydantic import BaseModel
 from datetime import datetime
+from typing import Any, Dict, List, Optional
 
 
 class DatasetListResponse(BaseModel):
@@ -13,13 +14,17 @@ class DatasetListResponse(BaseModel):
     Attributes:
         id (str): The unique identifier of the dataset.
         filename (str): The name of the uploaded file.
-        size (int): The size of the uploaded file in bytes.
+        size (int): The size of the uploaded file in bytes, including appended files.
+        row_count (Optional[int]): The number of rows in the dataset, if known.
         upload_date (datetime): The date and time when the dataset was uploaded.
+        expires_at (Optional[datetime]): The date and time after which the dataset expires, if any.
     """
     id: str
     filename: str
     size: int
+    row_count: Optional[int] = None
     upload_date: datetime
+    expires_at: Optional[datetime] = None
 
 
 class DatasetDetailResponse(BaseModel):
@@ -30,3 +35,35 @@ class DatasetDetailResponse(BaseModel):
         content (str): The content of the dataset, typically in JSON format.
     """
     content: str
+
+
+class DatasetRowsResponse(BaseModel):
+    """
+    Schema for retrieving the rows of a dataset matched by a key lookup.
+
+    Attributes:
+        rows (List[Dict[str, Any]]): The matching rows, keyed by column name.
+    """
+    rows: List[Dict[str, Any]]
+
+
+class AdmissionStatsResponse(BaseModel):
+    """
+    Schema for the state of the ingestion admission controller of a worker.
+
+    Attributes:
+        budget_bytes (int): The memory available to concurrent uploads in bytes.
+        reserved_bytes (int): The memory reserved by uploads being ingested in bytes.
+        available_bytes (int): The memory still available in bytes.
+        active (int): The number of uploads being ingested.
+        queue_depth (int): The number of uploads waiting for memory.
+        max_queue (int): The maximum number of uploads waiting for memory.
+        rejected (int): The number of uploads rejected since the worker started.
+    """
+    budget_bytes: int
+    reserved_bytes: int
+    available_bytes: int
+    active: int
+    queue_depth: int
+    max_queue: int
+    rejected: int
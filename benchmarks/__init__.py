@@ -0,0 +1,7 @@
+"""
+This package contains the offline benchmark suite for the dataset API.
+
+The benchmarks run against an in-memory mongomock database so they can be executed
+locally or in CI without network access, and write their results as JSON so runs can
+be compared against a stored baseline.
+"""
@@ -0,0 +1,96 @@
+"""
+This module generates synthetic CSV files with mixed column types for the benchmarks.
+"""
+
+import csv
+import os
+import random
+from datetime import date, timedelta
+
+# Header of the generated CSV files, one column per supported dtype
+COLUMNS = ["id", "user_id", "score", "ratio", "label", "active", "created_at", "comment"]
+
+SIZE_UNITS = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+LABELS = ["train", "test", "validation", "holdout"]
+WORDS = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta", "iota", "kappa"]
+
+
+def parse_size(size: str) -> int:
+    """
+    Convert a human readable size such as "1KB", "10MB" or "1GB" to a number of bytes.
+
+    :param size: The size string to convert.
+    :return: The size in bytes.
+    :raises ValueError: If the size string has an unknown unit.
+    """
+    size = size.strip().upper()
+    for unit, multiplier in SIZE_UNITS.items():
+        if size.endswith(unit):
+            return int(float(size[:-len(unit)]) * multiplier)
+    raise ValueError(f"Unknown size unit in '{size}', expected one of {', '.join(SIZE_UNITS)}")
+
+
+def generate_row(rng: random.Random, row_id: int) -> list:
+    """
+    Generate a single row of synthetic data.
+
+    Roughly 5% of the nullable columns are left empty so the parser has to handle missing values.
+
+    :param rng: The random number generator to draw values from.
+    :param row_id: The sequential identifier of the row.
+    :return: A list of values matching COLUMNS.
+    """
+    return [
+        row_id,
+        rng.randint(1, 1_000_000),
+        "" if rng.random() < 0.05 else round(rng.uniform(-1000, 1000), 4),
+        rng.random(),
+        rng.choice(LABELS),
+        rng.random() < 0.5,
+        (date(2020, 1, 1) + timedelta(days=rng.randint(0, 1500))).isoformat(),
+        "" if rng.random() < 0.05 else " ".join(rng.choices(WORDS, k=rng.randint(1, 6)))
+    ]
+
+
+def generate_csv(path: str, target_bytes: int, seed: int = 42) -> int:
+    """
+    Write a synthetic CSV file of approximately the requested size.
+
+    The output is deterministic for a given seed so that runs are reproducible.
+
+    :param path: The destination file path.
+    :param target_bytes: The approximate size of the file in bytes.
+    :param seed: The seed for the random number generator.
+    :return: The number of data rows written.
+    """
+    rng = random.Random(seed)
+    rows = 0
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(COLUMNS)
+        # Always write at least one data row, then stop once the target size is reached
+        while rows == 0 or file.tell() < target_bytes:
+            writer.writerow(generate_row(rng, rows))
+            rows += 1
+    return rows
+
+
+def get_or_generate_csv(directory: str, size: str, seed: int = 42) -> tuple:
+    """
+    Return a cached synthetic CSV for the given size, generating it on first use.
+
+    :param directory: The directory in which generated files are kept.
+    :param size: The human readable size of the file, e.g. "10MB".
+    :param seed: The seed for the random number generator.
+    :return: A tuple of the file path and the number of data rows it contains.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"synthetic-{size.upper()}-{seed}.csv")
+    if not os.path.exists(path):
+        # Generate into a temporary file first so an interrupted run never leaves a truncated CSV behind
+        generate_csv(f"{path}.tmp", parse_size(size), seed)
+        os.replace(f"{path}.tmp", path)
+    with open(path, "rb") as file:
+        rows = sum(1 for _ in file) - 1
+    return path, rows
@@ -0,0 +1,467 @@
+"""
+This module runs the benchmark suite for dataset ingestion, reads and authentication.
+
+Every benchmark runs offline against mongomock through the FastAPI test client. Results are
+written as JSON and can be compared against a previous run to fail on regressions:
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench.json --threshold 0.2
+    python -m benchmarks.run --sizes 1KB,1MB,100MB,1GB
+
+Worker startup is measured in fresh interpreters and the run fails if importing the application
+pulls in the pandas/numpy ingestion or pyarrow export stack eagerly.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# The application settings are read at import time, so provide offline defaults before importing the app
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "benchmark")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-that-is-long-enough-for-hs256")
+
+from benchmarks.data import get_or_generate_csv  # noqa: E402
+
+DEFAULT_SIZES = "1KB,1MB,10MB"
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "dataset-api-bench")
+
+# Imports the application in a fresh interpreter the way a uvicorn worker does and reports its cost
+STARTUP_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import app.main
+print(json.dumps({
+    "seconds": time.perf_counter() - started,
+    "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy_modules": sorted(name for name in ("pandas", "numpy", "pyarrow") if name in sys.modules)
+}))
+"""
+
+
+def percentiles(samples: list) -> dict:
+    """
+    Summarise latency samples in milliseconds.
+
+    :param samples: The latency samples in seconds.
+    :return: A dictionary with the p50, p90, p99 and mean latencies in milliseconds.
+    """
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] * 1000
+
+    return {
+        "p50": pick(0.50),
+        "p90": pick(0.90),
+        "p99": pick(0.99),
+        "mean": statistics.fmean(ordered) * 1000
+    }
+
+
+def peak_rss_bytes() -> int:
+    """
+    Return the peak resident set size of the current process.
+
+    :return: The peak RSS in bytes.
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes while macOS reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def metric(value: float, unit: str, better: str) -> dict:
+    """
+    Build a metric entry for the results file.
+
+    :param value: The measured value.
+    :param unit: The unit of the value.
+    :param better: Either "higher" or "lower", the direction in which the metric improves.
+    :return: The metric entry.
+    """
+    return {"value": value, "unit": unit, "better": better}
+
+
+def make_client(database, cache_dir: str):
+    """
+    Create a test client whose database and cache dependencies resolve to the given ones.
+
+    :param database: The mongomock database to serve requests from.
+    :param cache_dir: The directory of the local dataset cache, so runs never touch the real CACHE_DIR.
+    :return: A tuple of the test client, a valid bearer authorization header and the dataset cache.
+    """
+    from fastapi.testclient import TestClient
+
+    from app.admission import AdmissionController, get_admission_controller
+    from app.cache import DatasetCache, get_dataset_cache
+    from app.config import app_config
+    from app.database import get_database
+    from app.helper import generate_jwt
+    from app.main import app
+
+    cache = DatasetCache(cache_dir, app_config.CACHE_MAX_BYTES)
+    app.dependency_overrides[get_database] = lambda: database
+    app.dependency_overrides[get_dataset_cache] = lambda: cache
+    # Measure every size, including those the default memory budget of a worker rejects with 413
+    admission = AdmissionController(
+        sys.maxsize,
+        app_config.INGEST_MEMORY_FACTOR,
+        app_config.INGEST_MAX_QUEUE,
+        app_config.INGEST_QUEUE_TIMEOUT_SECONDS,
+        app_config.INGEST_RETRY_AFTER_SECONDS
+    )
+    app.dependency_overrides[get_admission_controller] = lambda: admission
+    headers = {"Authorization": f"Bearer {generate_jwt('benchmark@example.com')}"}
+    return TestClient(app), headers, cache
+
+
+def make_database():
+    """
+    Create an empty in-memory mongomock database.
+
+    :return: The mongomock database.
+    """
+    from mongomock import MongoClient
+
+    return MongoClient()["benchmark"]
+
+
+def bench_startup(iterations: int) -> dict:
+    """
+    Measure the import time and RSS of a worker starting up the application.
+
+    :param iterations: The number of fresh interpreters to start.
+    :return: The startup metrics keyed by metric name.
+    :raises RuntimeError: If the ingestion stack is imported eagerly at startup.
+    """
+    samples = []
+    for _ in range(iterations):
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_PROBE],
+            check=True,
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        ).stdout
+        samples.append(json.loads(output))
+
+    if samples[0]["heavy_modules"]:
+        raise RuntimeError(f"Startup imported {', '.join(samples[0]['heavy_modules'])} eagerly")
+
+    # Linux reports kilobytes while macOS reports bytes
+    rss_scale = 1 if sys.platform == "darwin" else 1024
+    return {
+        "startup.import_app.p50": metric(
+            percentiles([sample["seconds"] for sample in samples])["p50"], "ms", "lower"
+        ),
+        "startup.peak_rss": metric(
+            statistics.median(sample["rss"] for sample in samples) * rss_scale, "bytes", "lower"
+        )
+    }
+
+
+def _upload_worker(path: str, rows: int) -> dict:
+    """
+    Upload a single CSV file and measure its throughput and memory footprint.
+
+    This runs in a fresh process so that the peak RSS only covers a single upload. The ingestion
+    stack is loaded on the first upload of a worker, so an untimed warm-up upload runs first and
+    its latency is reported on its own.
+
+    :param path: The CSV file to upload.
+    :param rows: The number of data rows in the file.
+    :return: The raw measurements.
+    """
+    with tempfile.TemporaryDirectory() as cache_dir:
+        client, headers, _ = make_client(make_database(), cache_dir)
+        size = os.path.getsize(path)
+
+        started = time.perf_counter()
+        response = client.post(
+            "/datasets/upload",
+            files={"file": ("warm-up.csv", b"id,value\n1,2\n", "text/csv")},
+            headers=headers
+        )
+        first_request = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f"Warm-up upload failed: {response.status_code} {response.text}")
+        rss_before = peak_rss_bytes()
+
+        with open(path, "rb") as file:
+            started = time.perf_counter()
+            response = client.post(
+                "/datasets/upload",
+                files={"file": (os.path.basename(path), file, "text/csv")},
+                headers=headers
+            )
+            elapsed = time.perf_counter() - started
+
+    if response.status_code != 200:
+        raise RuntimeError(f"Upload of {path} failed: {response.status_code} {response.text}")
+
+    return {
+        "first_request_seconds": first_request,
+        "seconds": elapsed,
+        "bytes": size,
+        "rows": rows,
+        "rss_before": rss_before,
+        "rss_peak": peak_rss_bytes()
+    }
+
+
+def bench_upload(sizes: list, data_dir: str) -> dict:
+    """
+    Measure upload throughput and peak RSS for each synthetic file size.
+
+    :param sizes: The human readable sizes of the files to upload.
+    :param data_dir: The directory where synthetic files are generated.
+    :return: The upload metrics keyed by metric name.
+    """
+    metrics = {}
+    first_requests = []
+    context = multiprocessing.get_context("spawn")
+    for size in sizes:
+        path, rows = get_or_generate_csv(data_dir, size)
+        with context.Pool(1) as pool:
+            result = pool.apply(_upload_worker, (path, rows))
+
+        prefix = f"upload.{size.upper()}"
+        metrics[f"{prefix}.rows_per_s"] = metric(result["rows"] / result["seconds"], "rows/s", "higher")
+        metrics[f"{prefix}.mb_per_s"] = metric(result["bytes"] / 1024 ** 2 / result["seconds"], "MB/s", "higher")
+        metrics[f"{prefix}.peak_rss"] = metric(result["rss_peak"], "bytes", "lower")
+        metrics[f"{prefix}.rss_growth"] = metric(result["rss_peak"] - result["rss_before"], "bytes", "lower")
+        first_requests.append(result["first_request_seconds"])
+
+    # Every size runs in a fresh worker, so each one paid the first-request cost once
+    if first_requests:
+        metrics["upload.first_request.p50"] = metric(percentiles(first_requests)["p50"], "ms", "lower")
+    return metrics
+
+
+def bench_get_dataset(size: str, data_dir: str, iterations: int) -> dict:
+    """
+    Measure the latency of GET /datasets/{id} for a dataset of the given size.
+
+    Cold reads miss the local cache and render the dataset from the database, warm reads are
+    served from the memory-mapped cache entry. Both are reported, so a regression in the
+    database read path is not hidden by cache hits.
+
+    :param size: The human readable size of the dataset.
+    :param data_dir: The directory where synthetic files are generated.
+    :param iterations: The number of requests to time per read path.
+    :return: The latency metrics keyed by metric name.
+    """
+    database = make_database()
+    path, _ = get_or_generate_csv(data_dir, size)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        client, headers, cache = make_client(database, cache_dir)
+        with open(path, "rb") as file:
+            client.post("/datasets/upload", files={"file": ("get.csv", file, "text/csv")}, headers=headers)
+        dataset_id = str(database["dataset"].find_one({}, {"_id": 1})["_id"])
+
+        def time_reads(cold):
+            samples = []
+            for _ in range(iterations):
+                if cold:
+                    cache.invalidate(dataset_id)
+                started = time.perf_counter()
+                response = client.get(f"/datasets/{dataset_id}", headers=headers)
+                samples.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"GET /datasets/{dataset_id} failed: {response.status_code}")
+            return percentiles(samples)
+
+        cold_latency = time_reads(cold=True)
+        warm_latency = time_reads(cold=False)
+
+    metrics = {}
+    for path_name, latency in (("cold", cold_latency), ("warm", warm_latency)):
+        for name, value in latency.items():
+            metrics[f"get_dataset.{size.upper()}.{path_name}.{name}"] = metric(value, "ms", "lower")
+    return metrics
+
+
+def bench_list_datasets(count: int, iterations: int) -> dict:
+    """
+    Measure the latency of GET /datasets when the collection holds many datasets.
+
+    :param count: The number of datasets to seed.
+    :param iterations: The number of requests to time.
+    :return: The latency metrics keyed by metric name.
+    """
+    database = make_database()
+    upload_date = datetime.now()
+    database["dataset"].insert_many([{
+        "filename": f"dataset-{index}.csv",
+        "size": 1024,
+        "content": "[]",
+        "upload_date": upload_date
+    } for index in range(count)])
+
+    samples = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        client, headers, _ = make_client(database, cache_dir)
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = client.get("/datasets", headers=headers)
+            samples.append(time.perf_counter() - started)
+            if response.status_code != 200 or len(response.json()) != count:
+                raise RuntimeError(f"GET /datasets failed: {response.status_code}")
+
+    return {
+        f"list_datasets.{count}.{name}": metric(value, "ms", "lower")
+        for name, value in percentiles(samples).items()
+    }
+
+
+def bench_jwt(iterations: int) -> dict:
+    """
+    Measure the overhead JWTBearer adds to a request.
+
+    Two otherwise identical routes are timed, one protected by JWTBearer and one open, and the
+    raw cost of verify_jwt is measured on its own.
+
+    :param iterations: The number of requests to time per route.
+    :return: The authentication metrics keyed by metric name.
+    """
+    from fastapi import Depends, FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.helper import JWTBearer, generate_jwt, verify_jwt
+
+    app = FastAPI()
+
+    @app.get("/open")
+    async def open_route():
+        return {}
+
+    @app.get("/protected", dependencies=[Depends(JWTBearer())])
+    async def protected_route():
+        return {}
+
+    client = TestClient(app)
+    token = generate_jwt("benchmark@example.com")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def time_route(path):
+        samples = []
+        for _ in range(iterations):
+            started = time.perf_counter()
+            client.get(path, headers=headers)
+            samples.append(time.perf_counter() - started)
+        return percentiles(samples)
+
+    open_latency = time_route("/open")
+    protected_latency = time_route("/protected")
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        verify_jwt(token)
+    verify_seconds = (time.perf_counter() - started) / iterations
+
+    return {
+        "jwt.bearer_overhead.p50": metric(protected_latency["p50"] - open_latency["p50"], "ms", "lower"),
+        "jwt.protected.p50": metric(protected_latency["p50"], "ms", "lower"),
+        "jwt.verify_jwt": metric(verify_seconds * 1_000_000, "us", "lower")
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compare a run against a baseline and report the metrics that regressed.
+
+    :param current: The metrics of the current run.
+    :param baseline: The metrics of the baseline run.
+    :param threshold: The tolerated relative regression, e.g. 0.1 for 10%.
+    :return: A list of human readable regression descriptions.
+    """
+    regressions = []
+    for name, entry in current.items():
+        previous = baseline.get(name)
+        if not previous or not previous["value"]:
+            continue
+        change = (entry["value"] - previous["value"]) / abs(previous["value"])
+        # A regression is a drop for "higher is better" metrics and a rise for "lower is better" ones
+        worse = -change if entry["better"] == "higher" else change
+        if worse > threshold:
+            regressions.append(
+                f"{name}: {previous['value']:.4g} -> {entry['value']:.4g} {entry['unit']} ({worse:+.1%} worse)"
+            )
+    return regressions
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments of the benchmark runner.
+
+    :param argv: The arguments to parse, defaults to sys.argv.
+    :return: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Run the dataset API benchmark suite.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"Comma separated CSV sizes to upload, from 1KB up to 1GB (default: {DEFAULT_SIZES}).")
+    parser.add_argument("--get-size", default="1MB", help="Size of the dataset used for GET latency.")
+    parser.add_argument("--datasets", type=int, default=10_000, help="Number of datasets seeded for list latency.")
+    parser.add_argument("--iterations", type=int, default=50, help="Number of timed requests per latency benchmark.")
+    parser.add_argument("--startups", type=int, default=5, help="Number of fresh interpreters timed at startup.")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="Directory for generated CSV files.")
+    parser.add_argument("--output", default="bench.json", help="Path of the JSON results file.")
+    parser.add_argument("--baseline", help="Path of a previous results file to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative regression that fails the run when a baseline is given (default: 0.1).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """
+    Run the benchmark suite, write the results and compare them with the baseline.
+
+    :param argv: The command line arguments, defaults to sys.argv.
+    :return: The process exit code, 1 if any metric regressed beyond the threshold.
+    """
+    args = parse_args(argv)
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+
+    metrics = {}
+    metrics.update(bench_startup(args.startups))
+    metrics.update(bench_upload(sizes, args.data_dir))
+    metrics.update(bench_get_dataset(args.get_size, args.data_dir, args.iterations))
+    metrics.update(bench_list_datasets(args.datasets, args.iterations))
+    metrics.update(bench_jwt(args.iterations))
+
+    results = {
+        "meta": {
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform()
+        },
+        "metrics": metrics
+    }
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+
+    for name, entry in metrics.items():
+        print(f"{name:<45} {entry['value']:>14.3f} {entry['unit']}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(metrics, json.load(file)["metrics"], args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
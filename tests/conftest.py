@@ -4,6 +4,8 @@ from mongomock import MongoClient
 
 from app.main import app
 from app.database import get_database
+from app.cache import DatasetCache, get_dataset_cache
+from app.routes.DatasetRouter import indexed_databases
 
 client = MongoClient()
 db = client['test_database']
@@ -14,14 +16,26 @@ def mock_db():
     # set up the mock database
     yield db
     client.drop_database('test_database')
+    # the dropped indexes must be created again by the next upload
+    indexed_databases.clear()
 
 
 @pytest.fixture(scope='module')
-def test_client():
+def test_cache(tmp_path_factory):
+    # set up an empty local dataset cache
+    return DatasetCache(str(tmp_path_factory.mktemp("cache")), 1024 * 1024)
+
+
+@pytest.fixture(scope='module')
+def test_client(test_cache):
     def _get_test_database():
         return db
 
+    def _get_test_cache():
+        return test_cache
+
     app.dependency_overrides[get_database] = _get_test_database
+    app.dependency_overrides[get_dataset_cache] = _get_test_cache
     client = TestClient(app)
     yield client
     app.dependency_overrides = {}
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from app.admission import AdmissionController, AdmissionRejected, UploadTooLarge
+
+
+def make_controller(budget_bytes=100, max_queue=2, queue_timeout=1.0):
+    return AdmissionController(budget_bytes, 2.0, max_queue, queue_timeout, 5)
+
+
+def test_estimate_is_proportional_to_size():
+    """
+    Test that uploads are estimated at their size times the memory factor, even beyond the budget.
+    """
+    controller = make_controller()
+
+    assert controller.estimate(10) == 20
+    assert controller.estimate(1000) == 2000
+
+
+def test_upload_larger_than_budget_is_rejected():
+    """
+    Test that an upload estimated above the whole budget is rejected even on an idle worker.
+    """
+    controller = make_controller()
+
+    with pytest.raises(UploadTooLarge) as error:
+        asyncio.run(controller.acquire(controller.estimate(51)))
+
+    assert error.value.max_size == 50
+    assert controller.stats()["reserved_bytes"] == 0
+    assert controller.stats()["rejected"] == 1
+
+
+def test_waiting_upload_is_admitted_on_release():
+    """
+    Test that an upload waits in the queue until enough memory is released.
+    """
+    controller = make_controller()
+
+    async def scenario():
+        await controller.acquire(80)
+        waiting = asyncio.create_task(controller.acquire(50))
+        await asyncio.sleep(0)
+        assert controller.stats()["queue_depth"] == 1
+        assert not waiting.done()
+
+        controller.release(80)
+        await waiting
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["reserved_bytes"] == 50
+    assert stats["active"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_upload_rejected_when_queue_is_full():
+    """
+    Test that uploads are rejected once the queue is full.
+    """
+    controller = make_controller(max_queue=0)
+
+    async def scenario():
+        await controller.acquire(100)
+        with pytest.raises(AdmissionRejected) as error:
+            await controller.acquire(1)
+        return error.value
+
+    assert asyncio.run(scenario()).retry_after == 5
+    assert controller.stats()["rejected"] == 1
+
+
+def test_upload_rejected_after_queue_timeout():
+    """
+    Test that a queued upload is rejected when its wait times out, and leaves the queue.
+    """
+    controller = make_controller(queue_timeout=0.01)
+
+    async def scenario():
+        async with controller.reserve(100):
+            with pytest.raises(AdmissionRejected):
+                await controller.acquire(10)
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["reserved_bytes"] == 0
+    assert stats["queue_depth"] == 0
+    assert stats["rejected"] == 1
@@ -0,0 +1,78 @@
+import os
+import time
+
+import pytest
+
+from app.cache import DatasetCache, iter_buffer
+
+
+def test_cache_put_and_open(tmp_path):
+    """
+    Test that a stored entry can be memory-mapped and streamed back.
+    """
+    cache = DatasetCache(str(tmp_path), 1024)
+    cache.put("dataset", "json", b'{"content": "[]"}')
+
+    assert b"".join(iter_buffer(cache.open("dataset", "json"), chunk_size=4)) == b'{"content": "[]"}'
+    assert cache.open("missing", "json") is None
+
+
+def test_cache_store_returns_map_that_survives_eviction(tmp_path):
+    """
+    Test that the map returned by store stays readable when another worker evicts the entry.
+    """
+    cache = DatasetCache(str(tmp_path), 1024)
+    buffer = cache.store("dataset", "json", lambda file: file.write(b'{"content": "[]"}'))
+
+    cache.invalidate("dataset")
+    assert cache.open("dataset", "json") is None
+    assert b"".join(iter_buffer(buffer)) == b'{"content": "[]"}'
+
+
+def test_cache_writer_discards_partial_entry(tmp_path):
+    """
+    Test that a failed write neither publishes the entry nor leaves a temporary file behind.
+    """
+    cache = DatasetCache(str(tmp_path), 1024)
+
+    with pytest.raises(RuntimeError):
+        with cache.writer("dataset", "json") as file:
+            file.write(b"partial")
+            raise RuntimeError("encoding failed")
+
+    assert cache.open("dataset", "json") is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """
+    Test that the cache evicts the least recently used entries once it exceeds its budget.
+    """
+    cache = DatasetCache(str(tmp_path), 250)
+    cache.put("first", "json", b"x" * 100)
+    cache.put("second", "json", b"x" * 100)
+
+    # Mark the first entry as older than the second one, then read it so it becomes the most recent
+    os.utime(tmp_path / "first.json", (time.time() - 60, time.time() - 60))
+    os.utime(tmp_path / "second.json", (time.time() - 30, time.time() - 30))
+    cache.open("first", "json").close()
+
+    cache.put("third", "json", b"x" * 100)
+
+    assert cache.open("first", "json") is not None
+    assert cache.open("second", "json") is None
+    assert cache.open("third", "json") is not None
+
+
+def test_cache_invalidate(tmp_path):
+    """
+    Test that invalidating a dataset removes all of its artifacts only.
+    """
+    cache = DatasetCache(str(tmp_path), 1024)
+    cache.put("dataset", "json", b"{}")
+    cache.put("dataset", "parquet", b"PAR1")
+    cache.put("other", "json", b"{}")
+
+    cache.invalidate("dataset")
+
+    assert sorted(os.listdir(tmp_path)) == ["other.json"]
@@ -1,6 +1,25 @@
+import asyncio
+import io
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+from bson.objectid import ObjectId
 from fastapi import status
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from pymongo.errors import AutoReconnect
 
+from app.admission import AdmissionController, get_admission_controller
+from app.config import app_config
+from app.controllers import DatasetController
+from app.controllers.DatasetController import append_dataset_chunks, create_dataset_indexes, insert_dataset
 from app.helper import get_password_hash
+from app.main import app
+from app.routes import DatasetRouter
 
 
 def get_token(test_client, mock_db):
@@ -15,6 +34,30 @@ def get_token(test_client, mock_db):
     return response.json()["token"]
 
 
+def on_event_loop():
+    # Whether the caller runs on the event loop rather than in the threadpool
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+def upload_sample(test_client, mock_db, token, filename):
+    # Upload tests/sample.csv under the given name and return the stored dataset document
+    with open("tests/sample.csv", "rb") as file:
+        response = test_client.post(
+            "/datasets/upload",
+            files={"file": (filename, file, "text/csv")},
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+    assert response.status_code == status.HTTP_200_OK
+
+    return mock_db["dataset"].find_one({"filename": filename}, sort=[("_id", -1)])
+
+
 # Sample unit test for the upload dataset endpoint
 def test_upload_dataset_csv(test_client, mock_db):
     # get jwt token
@@ -56,6 +99,27 @@ def test_upload_dataset_invalid_file_type(test_client, mock_db):
     }
 
 
+def test_upload_dataset_creates_indexes_once(test_client, mock_db, monkeypatch):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    calls = []
+    monkeypatch.setattr("app.routes.DatasetRouter.indexed_databases", set())
+    monkeypatch.setattr("app.routes.DatasetRouter.create_dataset_indexes", lambda *collections: calls.append(1))
+    for _ in range(2):
+        with open("tests/sample.csv", "rb") as file:
+            response = test_client.post(
+                "/datasets/upload",
+                files={"file": ("sample.csv", file, "text/csv")},
+                headers={
+                    "Authorization": f"Bearer {token}"
+                }
+            )
+        assert response.status_code == status.HTTP_200_OK
+
+    assert len(calls) == 1
+
+
 def test_get_all_datasets(test_client, mock_db):
     # get jwt token
     token = get_token(test_client, mock_db)
@@ -98,3 +162,661 @@ def test_delete_dataset(test_client, mock_db):
     )
     assert response.status_code == status.HTTP_500_INTERNAL_SERVER_ERROR  # Assuming ID doesn't exist
     assert response.json()["code"] == status.HTTP_500_INTERNAL_SERVER_ERROR
+
+
+def test_get_dataset_served_from_cache(test_client, mock_db, test_cache):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    with open("tests/sample.csv", "rb") as file:
+        test_client.post(
+            "/datasets/upload",
+            files={"file": ("cached.csv", file, "text/csv")},
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+    dataset_id = str(mock_db["dataset"].find_one({"filename": "cached.csv"})["_id"])
+
+    first = test_client.get(f"/datasets/{dataset_id}", headers={"Authorization": f"Bearer {token}"})
+    assert first.status_code == status.HTTP_200_OK
+    assert test_cache.open(dataset_id, "v1.json") is not None
+
+    # The second read is streamed from the cache file and must be identical
+    second = test_client.get(f"/datasets/{dataset_id}", headers={"Authorization": f"Bearer {token}"})
+    assert second.status_code == status.HTTP_200_OK
+    assert second.json() == first.json()
+
+    response = test_client.delete(f"/datasets/{dataset_id}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert test_cache.open(dataset_id, "v1.json") is None
+
+    response = test_client.get(f"/datasets/{dataset_id}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_get_dataset_streamed_into_cache_matches_rendered_response(test_client, mock_db, test_cache, monkeypatch):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    # Quotes, backslashes and non-ASCII text spread over several chunks must be escaped as a whole
+    monkeypatch.setattr(app_config, "CHUNK_ROWS", 1)
+    contents = 'id,name\n1,"say ""hi"""\n2,caf\u00e9\n3,back\\slash\n'.encode("utf-8")
+    response = test_client.post(
+        "/datasets/upload",
+        files={"file": ("escaped.csv", contents, "text/csv")},
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == status.HTTP_200_OK
+    dataset_id = str(mock_db["dataset"].find_one({"filename": "escaped.csv"})["_id"])
+
+    response = test_client.get(f"/datasets/{dataset_id}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    records = [{"id": 1, "name": 'say "hi"'}, {"id": 2, "name": "caf\u00e9"}, {"id": 3, "name": "back\\slash"}]
+    assert response.content == JSONResponse(content={"content": json.dumps(records)}).body
+    assert test_cache.open(dataset_id, "v1.json") is not None
+
+
+def test_get_dataset_when_cache_entry_is_evicted_concurrently(test_client, mock_db, test_cache, monkeypatch):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    dataset_id = str(upload_sample(test_client, mock_db, token, "evicted.csv")["_id"])
+    expected = test_client.get(f"/datasets/{dataset_id}", headers={"Authorization": f"Bearer {token}"}).content
+
+    # Another worker evicts every entry as soon as it is published
+    monkeypatch.setattr(test_cache, "open", lambda dataset_id, name: None)
+    for path in (f"/datasets/{dataset_id}", f"/datasets/{dataset_id}/export?format=arrow"):
+        response = test_client.get(path, headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == status.HTTP_200_OK
+    assert test_client.get(f"/datasets/{dataset_id}", headers={"Authorization": f"Bearer {token}"}).content == expected
+
+
+def test_delete_dataset_reclaims_storage(test_client, mock_db):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    with open("tests/sample.csv", "rb") as file:
+        test_client.post(
+            "/datasets/upload",
+            files={"file": ("deleted.csv", file, "text/csv")},
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+    dataset_id = mock_db["dataset"].find_one({"filename": "deleted.csv"})["_id"]
+    assert mock_db["dataset_chunk"].count_documents({"dataset_id": dataset_id}) == 1
+
+    response = test_client.delete(f"/datasets/{dataset_id}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+
+    # The background collector has removed the dataset and its chunks once the response is sent
+    assert mock_db["dataset"].find_one({"_id": dataset_id}) is None
+    assert mock_db["dataset_chunk"].count_documents({"dataset_id": dataset_id}) == 0
+
+    response = test_client.delete(f"/datasets/{dataset_id}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    assert response.json() == {
+        "code": status.HTTP_404_NOT_FOUND,
+        "message": "Dataset not found"
+    }
+
+
+def test_collect_garbage_clears_backlog(test_client, mock_db, test_cache, monkeypatch):
+    # More deleted datasets than a single round collects
+    monkeypatch.setattr(app_config, "GC_MAX_DATASETS", 2)
+    dataset_ids = mock_db["dataset"].insert_many([
+        {"filename": "backlog.csv", "deleted_at": datetime.now(timezone.utc)} for _ in range(5)
+    ]).inserted_ids
+
+    DatasetRouter.collect_garbage(mock_db, test_cache)
+    assert mock_db["dataset"].count_documents({"_id": {"$in": dataset_ids}}) == 0
+
+
+def test_periodic_sweep_collects_without_a_delete(test_client, mock_db, monkeypatch):
+    # A dataset whose purge was interrupted, e.g. by a worker restart
+    monkeypatch.setattr(app_config, "GC_INTERVAL_SECONDS", 0.01)
+    dataset_id = mock_db["dataset"].insert_one(
+        {"filename": "interrupted.csv", "deleted_at": datetime.now(timezone.utc)}
+    ).inserted_id
+    mock_db["dataset_chunk"].insert_one({"dataset_id": dataset_id, "index": 0, "rows": 0, "content": "[]"})
+
+    # Entering the client starts the worker lifespan and with it the sweep
+    with TestClient(app):
+        for _ in range(100):
+            if mock_db["dataset"].find_one({"_id": dataset_id}) is None:
+                break
+            time.sleep(0.01)
+
+    assert mock_db["dataset"].find_one({"_id": dataset_id}) is None
+    assert mock_db["dataset_chunk"].count_documents({"dataset_id": dataset_id}) == 0
+
+
+def test_upload_dataset_with_ttl(test_client, mock_db):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    with open("tests/sample.csv", "rb") as file:
+        response = test_client.post(
+            "/datasets/upload",
+            files={"file": ("scratch.csv", file, "text/csv")},
+            data={"ttl_seconds": "3600"},
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+    assert response.status_code == status.HTTP_200_OK
+
+    dataset = mock_db["dataset"].find_one({"filename": "scratch.csv"})
+    assert dataset["expires_at"].replace(tzinfo=timezone.utc) > datetime.now(timezone.utc)
+    assert mock_db["dataset_chunk"].find_one({"dataset_id": dataset["_id"]})["expires_at"] == dataset["expires_at"]
+    response = test_client.get(f"/datasets/{dataset['_id']}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+
+    # Once expired the dataset is hidden, even before the TTL monitor removes it
+    mock_db["dataset"].update_one({"_id": dataset["_id"]}, {"$set": {"expires_at": datetime.now(timezone.utc)}})
+    response = test_client.get(f"/datasets/{dataset['_id']}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_404_NOT_FOUND
+    listed = test_client.get("/datasets", headers={"Authorization": f"Bearer {token}"}).json()
+    assert str(dataset["_id"]) not in [item["id"] for item in listed]
+
+
+def test_append_dataset(test_client, mock_db):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    with open("tests/sample.csv", "rb") as file:
+        test_client.post(
+            "/datasets/upload",
+            files={"file": ("daily.csv", file, "text/csv")},
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+    dataset = mock_db["dataset"].find_one({"filename": "daily.csv"})
+    dataset_id = str(dataset["_id"])
+    original = test_client.get(f"/datasets/{dataset_id}", headers={"Authorization": f"Bearer {token}"}).json()
+
+    with open("tests/sample.csv", "rb") as file:
+        response = test_client.post(
+            f"/datasets/{dataset_id}/append",
+            files={"file": ("daily.csv", file, "text/csv")},
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == {
+        "code": status.HTTP_200_OK,
+        "message": "Append successfully"
+    }
+
+    # Only the new rows are written, as an additional chunk
+    appended = mock_db["dataset"].find_one({"_id": dataset["_id"]})
+    assert appended["row_count"] == 2 * dataset["row_count"]
+    assert appended["size"] == 2 * dataset["size"]
+    assert mock_db["dataset_chunk"].count_documents({"dataset_id": dataset["_id"]}) == 2
+
+    response = test_client.get(f"/datasets/{dataset_id}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == status.HTTP_200_OK
+    assert json.loads(response.json()["content"]) == 2 * json.loads(original["content"])
+
+
+def test_append_dataset_columns_mismatch(test_client, mock_db):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    dataset_id = str(upload_sample(test_client, mock_db, token, "mismatch.csv")["_id"])
+    response = test_client.post(
+        f"/datasets/{dataset_id}/append",
+        files={"file": ("other.csv", b"id,value\n1,2\n", "text/csv")},
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["code"] == status.HTTP_400_BAD_REQUEST
+
+
+def test_append_dataset_concurrent_conflict(test_client, mock_db, monkeypatch):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    with open("tests/sample.csv", "rb") as file:
+        test_client.post(
+            "/datasets/upload",
+            files={"file": ("concurrent.csv", file, "text/csv")},
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+    stale = mock_db["dataset"].find_one({"filename": "concurrent.csv"})
+    dataset_id = str(stale["_id"])
+
+    with open("tests/sample.csv", "rb") as file:
+        response = test_client.post(
+            f"/datasets/{dataset_id}/append",
+            files={"file": ("concurrent.csv", file, "text/csv")},
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+    assert response.status_code == status.HTTP_200_OK
+
+    # A second append that read the dataset before the first one committed claims the same chunk position
+    monkeypatch.setattr("app.routes.DatasetRouter.get_dataset_by_id", lambda collection, dataset_id: stale)
+    with open("tests/sample.csv", "rb") as file:
+        response = test_client.post(
+            f"/datasets/{dataset_id}/append",
+            files={"file": ("concurrent.csv", file, "text/csv")},
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.json() == {
+        "code": status.HTTP_409_CONFLICT,
+        "message": "Dataset was modified concurrently, please retry."
+    }
+    assert mock_db["dataset"].find_one({"_id": stale["_id"]})["row_count"] == 2 * stale["row_count"]
+    assert mock_db["dataset_chunk"].count_documents({"dataset_id": stale["_id"]}) == 2
+
+
+class FailingCollection:
+    # A collection whose inserts fail like a dropped connection
+    def __init__(self, collection):
+        self.collection = collection
+
+    def insert_many(self, documents):
+        raise AutoReconnect("connection closed")
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def test_append_dataset_chunks_failed_write_is_discarded(mock_db):
+    create_dataset_indexes(mock_db["dataset"], mock_db["dataset_chunk"], mock_db["dataset_key"])
+    dataset_id = ObjectId()
+    mock_db["dataset"].insert_one({"_id": dataset_id, "size": 1, "row_count": 1, "chunk_count": 0, "version": 1})
+    dataset = mock_db["dataset"].find_one({"_id": dataset_id})
+    chunks = [(1, '[{"id": 1}]')]
+    keys = [("id", "1", 0, 0)]
+
+    # The chunks are written, then the key insert fails
+    with pytest.raises(AutoReconnect):
+        append_dataset_chunks(
+            mock_db["dataset"], mock_db["dataset_chunk"], FailingCollection(mock_db["dataset_key"]),
+            dataset, 1, None, chunks, keys
+        )
+    assert mock_db["dataset_chunk"].count_documents({"dataset_id": dataset_id}) == 0
+
+    # A retry is not blocked by the chunk position of the failed attempt
+    assert append_dataset_chunks(
+        mock_db["dataset"], mock_db["dataset_chunk"], mock_db["dataset_key"], dataset, 1, None, chunks, keys
+    )
+    assert mock_db["dataset"].find_one({"_id": dataset_id})["chunk_count"] == 1
+
+
+def test_insert_dataset_failed_write_is_discarded(mock_db):
+    chunk_count = mock_db["dataset_chunk"].count_documents({})
+    with pytest.raises(AutoReconnect):
+        insert_dataset(
+            mock_db["dataset"], mock_db["dataset_chunk"], FailingCollection(mock_db["dataset_key"]),
+            "orphan.csv", 1, ["id"], {"id": "int64"}, [(1, '[{"id": 1}]')], ["id"], [("id", "1", 0, 0)]
+        )
+
+    # No chunks are left behind without a dataset document pointing at them
+    assert mock_db["dataset"].find_one({"filename": "orphan.csv"}) is None
+    assert mock_db["dataset_chunk"].count_documents({}) == chunk_count
+
+
+def test_append_dataset_chunks_discards_stale_uncommitted(mock_db, monkeypatch):
+    create_dataset_indexes(mock_db["dataset"], mock_db["dataset_chunk"], mock_db["dataset_key"])
+    dataset_id = ObjectId()
+    mock_db["dataset"].insert_one({"_id": dataset_id, "size": 1, "row_count": 0, "chunk_count": 0, "version": 1})
+    dataset = mock_db["dataset"].find_one({"_id": dataset_id})
+
+    # Chunks and keys of an append whose process crashed before committing them
+    crashed_batch = ObjectId.from_datetime(
+        datetime.now(timezone.utc) - timedelta(seconds=DatasetController.STALE_BATCH_SECONDS + 60)
+    )
+    mock_db["dataset_chunk"].insert_one(
+        {"dataset_id": dataset_id, "index": 0, "batch_id": crashed_batch, "rows": 1, "content": "[1]"}
+    )
+    mock_db["dataset_key"].insert_one(
+        {"dataset_id": dataset_id, "column": "id", "value": "1", "chunk": 0, "offset": 0, "batch_id": crashed_batch}
+    )
+
+    assert append_dataset_chunks(
+        mock_db["dataset"], mock_db["dataset_chunk"], mock_db["dataset_key"],
+        dataset, 1, None, [(1, '[{"id": 2}]')], [("id", "2", 0, 0)]
+    )
+    assert mock_db["dataset_chunk"].count_documents({"batch_id": crashed_batch}) == 0
+    assert mock_db["dataset_key"].count_documents({"batch_id": crashed_batch}) == 0
+    assert mock_db["dataset_chunk"].find_one({"dataset_id": dataset_id})["content"] == '[{"id": 2}]'
+
+
+def test_export_dataset(test_client, mock_db, test_cache):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    # Export a dataset with an appended chunk, so it spans several record batches
+    dataset_id = str(upload_sample(test_client, mock_db, token, "exported.csv")["_id"])
+    with open("tests/sample.csv", "rb") as file:
+        response = test_client.post(
+            f"/datasets/{dataset_id}/append",
+            files={"file": ("exported.csv", file, "text/csv")},
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+    assert response.status_code == status.HTTP_200_OK
+    dataset = mock_db["dataset"].find_one({"_id": ObjectId(dataset_id)})
+
+    response = test_client.get(
+        f"/datasets/{dataset_id}/export?format=parquet",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/vnd.apache.parquet"
+    table = pq.read_table(io.BytesIO(response.content))
+    assert table.num_rows == dataset["row_count"]
+    assert table.column_names == dataset["columns"]
+    assert test_cache.open(dataset_id, f"v{dataset['version']}.parquet") is not None
+
+    response = test_client.get(
+        f"/datasets/{dataset_id}/export?format=arrow",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert pa.ipc.open_stream(response.content).read_all().equals(table)
+
+
+def test_export_dataset_encodes_off_the_event_loop(test_client, mock_db, monkeypatch):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    calls = []
+    encode = DatasetRouter.write_export
+
+    def record_write_export(*args):
+        calls.append(on_event_loop())
+        return encode(*args)
+
+    monkeypatch.setattr("app.routes.DatasetRouter.write_export", record_write_export)
+    dataset_id = str(upload_sample(test_client, mock_db, token, "threadpool.csv")["_id"])
+    for _ in range(2):
+        response = test_client.get(
+            f"/datasets/{dataset_id}/export?format=arrow",
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+    # Encoded once in the threadpool, then served from the cache
+    assert calls == [False]
+
+
+def test_export_dataset_invalid_format(test_client, mock_db):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    dataset_id = str(upload_sample(test_client, mock_db, token, "exported.csv")["_id"])
+    response = test_client.get(
+        f"/datasets/{dataset_id}/export?format=xlsx",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["code"] == status.HTTP_400_BAD_REQUEST
+
+
+def test_get_dataset_rows_by_key(test_client, mock_db, monkeypatch):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    # Store two rows per chunk so the lookup has to pick the right chunks
+    monkeypatch.setattr(app_config, "CHUNK_ROWS", 2)
+    with open("tests/sample.csv", "rb") as file:
+        response = test_client.post(
+            "/datasets/upload",
+            files={"file": ("patients.csv", file, "text/csv")},
+            data={"key_columns": ["PatientId"]},
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+    assert response.status_code == status.HTTP_200_OK
+    dataset_id = str(mock_db["dataset"].find_one({"filename": "patients.csv"})["_id"])
+
+    response = test_client.get(
+        f"/datasets/{dataset_id}/rows/by-key?column=PatientId&value=125125",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == status.HTTP_200_OK
+    rows = response.json()["rows"]
+    assert len(rows) == 1
+    assert rows[0]["PatientId"] == 125125
+    assert rows[0]["Suffix"] is None
+
+    # Batched lookup across chunks, unknown keys are ignored
+    response = test_client.get(
+        f"/datasets/{dataset_id}/rows/by-key?column=PatientId&value=125123&value=125126&value=1",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert [row["PatientId"] for row in response.json()["rows"]] == [125123, 125126]
+
+    # Numeric keys are matched by value, not by their text
+    response = test_client.get(
+        f"/datasets/{dataset_id}/rows/by-key?column=PatientId&value=125125.0&value=1.25126e5",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert [row["PatientId"] for row in response.json()["rows"]] == [125125, 125126]
+
+    # Appended rows are indexed as well
+    with open("tests/sample.csv", "rb") as file:
+        test_client.post(
+            f"/datasets/{dataset_id}/append",
+            files={"file": ("patients.csv", file, "text/csv")},
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+    response = test_client.get(
+        f"/datasets/{dataset_id}/rows/by-key?column=PatientId&value=125125",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert len(response.json()["rows"]) == 2
+
+    response = test_client.get(
+        f"/datasets/{dataset_id}/rows/by-key?column=City&value=Seattle",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_upload_dataset_chunks_are_bounded_in_bytes(test_client, mock_db, monkeypatch):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    # Wide rows close a chunk long before the row limit is reached
+    monkeypatch.setattr(app_config, "CHUNK_BYTES", 1000)
+    columns = [f"c{index}" for index in range(20)]
+    rows = [[row] + [row * 1000.5 + index for index in range(1, 20)] for row in range(30)]
+    contents = "\n".join([",".join(columns)] + [",".join(str(value) for value in row) for row in rows]) + "\n"
+    response = test_client.post(
+        "/datasets/upload",
+        files={"file": ("wide.csv", contents.encode("utf-8"), "text/csv")},
+        data={"key_columns": ["c0"]},
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == status.HTTP_200_OK
+    dataset = mock_db["dataset"].find_one({"filename": "wide.csv"})
+
+    chunks = list(mock_db["dataset_chunk"].find({"dataset_id": dataset["_id"]}))
+    assert len(chunks) > 1
+    assert all(len(chunk["content"]) <= 1000 for chunk in chunks)
+    assert sum(chunk["rows"] for chunk in chunks) == 30
+
+    # Key positions follow the chunks actually produced
+    for key in (0, 17, 29):
+        response = test_client.get(
+            f"/datasets/{dataset['_id']}/rows/by-key?column=c0&value={key}",
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+        assert [row["c0"] for row in response.json()["rows"]] == [key]
+
+    response = test_client.get(f"/datasets/{dataset['_id']}", headers={"Authorization": f"Bearer {token}"})
+    assert [record["c0"] for record in json.loads(response.json()["content"])] == list(range(30))
+
+
+def test_get_dataset_rows_by_bool_key(test_client, mock_db):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    response = test_client.post(
+        "/datasets/upload",
+        files={"file": ("flags.csv", b"id,active\n1,True\n2,False\n", "text/csv")},
+        data={"key_columns": ["active"]},
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.status_code == status.HTTP_200_OK
+    dataset_id = str(mock_db["dataset"].find_one({"filename": "flags.csv"})["_id"])
+
+    response = test_client.get(
+        f"/datasets/{dataset_id}/rows/by-key?column=active&value=true",
+        headers={
+            "Authorization": f"Bearer {token}"
+        }
+    )
+    assert response.json()["rows"] == [{"id": 1, "active": True}]
+
+
+def test_upload_dataset_unknown_key_column(test_client, mock_db):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    with open("tests/sample.csv", "rb") as file:
+        response = test_client.post(
+            "/datasets/upload",
+            files={"file": ("sample.csv", file, "text/csv")},
+            data={"key_columns": ["user_id"]},
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json() == {
+        "code": status.HTTP_400_BAD_REQUEST,
+        "message": "Key columns not found in the CSV file: user_id"
+    }
+
+
+def test_upload_dataset_stores_off_the_event_loop(test_client, mock_db, monkeypatch):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    calls = []
+    store = DatasetRouter.insert_dataset
+
+    def record_insert_dataset(*args):
+        calls.append(on_event_loop())
+        return store(*args)
+
+    monkeypatch.setattr("app.routes.DatasetRouter.insert_dataset", record_insert_dataset)
+    upload_sample(test_client, mock_db, token, "threadpool.csv")
+    assert calls == [False]
+
+
+def test_upload_dataset_larger_than_memory_budget(test_client, mock_db):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    # An idle worker whose whole budget fits files of at most 10 bytes
+    app.dependency_overrides[get_admission_controller] = lambda: AdmissionController(200, 20.0, 8, 1.0, 7)
+
+    try:
+        with open("tests/sample.csv", "rb") as file:
+            response = test_client.post(
+                "/datasets/upload",
+                files={"file": ("sample.csv", file, "text/csv")},
+                headers={
+                    "Authorization": f"Bearer {token}"
+                }
+            )
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        assert response.json() == {
+            "code": status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            "message": "File is too large to ingest, the maximum size is 10 bytes."
+        }
+    finally:
+        del app.dependency_overrides[get_admission_controller]
+
+
+def test_upload_dataset_rejected_when_memory_budget_is_used_up(test_client, mock_db):
+    # get jwt token
+    token = get_token(test_client, mock_db)
+
+    # A worker whose whole budget is reserved by another upload and which cannot queue any more
+    admission = AdmissionController(1024, 0.5, 0, 1.0, 7)
+    asyncio.run(admission.acquire(1024))
+    app.dependency_overrides[get_admission_controller] = lambda: admission
+
+    try:
+        with open("tests/sample.csv", "rb") as file:
+            response = test_client.post(
+                "/datasets/upload",
+                files={"file": ("sample.csv", file, "text/csv")},
+                headers={
+                    "Authorization": f"Bearer {token}"
+                }
+            )
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response.headers["Retry-After"] == "7"
+        assert response.json()["code"] == status.HTTP_503_SERVICE_UNAVAILABLE
+
+        response = test_client.get(
+            "/datasets/admission",
+            headers={
+                "Authorization": f"Bearer {token}"
+            }
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {
+            "budget_bytes": 1024,
+            "reserved_bytes": 1024,
+            "available_bytes": 0,
+            "active": 1,
+            "queue_depth": 0,
+            "max_queue": 0,
+            "rejected": 1
+        }
+    finally:
+        del app.dependency_overrides[get_admission_controller]
@@ -0,0 +1,20 @@
+import subprocess
+import sys
+
+
+def test_app_import_does_not_load_ingestion_stack():
+    """
+    Test that importing the application does not eagerly import pandas, numpy or pyarrow.
+    """
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; import app.main; print(','.join(m for m in ('pandas', 'numpy', 'pyarrow') if m in sys.modules))"
+        ],
+        check=True,
+        capture_output=True,
+        text=True
+    ).stdout
+
+    assert output.strip() == ""